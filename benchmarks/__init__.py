@@ -0,0 +1,15 @@
+import os
+import sys
+
+# Benchmarks run the app modules the same way `streamlit run src/app.py`
+# does (src/ on sys.path), with the response and fragment caches off and the
+# client-side rate limit lifted so only the fake LLM's latency is measured.
+os.environ.setdefault("ATLAS_LLM_BACKEND", "local")
+os.environ.setdefault("ATLAS_LLM_CACHE", "0")
+os.environ.setdefault("ATLAS_FRAGMENT_CACHE", "0")
+os.environ.setdefault("ATLAS_LLM_RATE_PER_MIN", "1000000")
+os.environ.setdefault("ATLAS_LLM_BURST", "1000000")
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
@@ -0,0 +1,70 @@
+import random
+import threading
+import time
+
+from utils.llm_backends import LocalBackend, LLMResponse
+
+
+def parse_latency(spec):
+    """
+    Latency distribution spec → zero-arg sampler (seconds):
+      "fixed:0.2", "uniform:0.1,0.5", "lognormal:0.8,0.5" (median, sigma)
+    """
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v] or [0.0]
+    if kind == "fixed":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "lognormal":
+        import math
+        mu = math.log(values[0]) if values[0] > 0 else 0.0
+        return lambda rng: rng.lognormvariate(mu, values[1])
+    raise ValueError(f"Unknown latency spec: {spec}")
+
+
+class FakeBackend(LocalBackend):
+    """
+    Synthetic LLM for benchmarks: LocalBackend output (sized by the trip's
+    days and cities) with configurable latency and a malformed-JSON rate.
+    Malformed answers are fenced, get trailing commas, or are truncated.
+    """
+
+    name = "fake"
+
+    def __init__(self, latency="fixed:0", malformed_rate=0.0, seed=0):
+        self.sample_latency = parse_latency(latency)
+        self.malformed_rate = malformed_rate
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate(self, prompt, model, generation_config=None, timeout=None):
+        with self._lock:
+            self.calls += 1
+            delay = self.sample_latency(self.rng)
+            corrupt = self.rng.random() < self.malformed_rate
+            mode = self.rng.choice(("fence", "trailing_comma", "truncate"))
+
+        response = super().generate(prompt, model, generation_config)
+        if corrupt:
+            response = LLMResponse(
+                self.corrupt(response.text, mode),
+                response.prompt_tokens,
+                response.response_tokens,
+            )
+        if timeout and delay > timeout:
+            # Like a client-side request timeout: give the worker back
+            time.sleep(timeout)
+            raise TimeoutError(f"fake LLM call exceeded {timeout}s")
+        if delay:
+            time.sleep(delay)
+        return response
+
+    @staticmethod
+    def corrupt(text, mode):
+        if mode == "fence":
+            return f"```json\n{text}\n```\nHope this helps!"
+        if mode == "trailing_comma":
+            return text.replace("]", ",]").replace("}", ",}")
+        return text[: int(len(text) * 0.8)]
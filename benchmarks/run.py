@@ -0,0 +1,224 @@
+"""
+ATLAS benchmark suite.
+
+    python -m benchmarks.run --out bench.json
+    python -m benchmarks.run --latency lognormal:0.8,0.5 --malformed 0.2 --quick
+
+Runs run_agentic_pipeline against a fake LLM and microbenchmarks the local
+hot paths across trip sizes. Results are written as sorted JSON so two runs
+can be diffed directly.
+
+The startup check imports src/app.py in fresh interpreters and exits
+non-zero if the cold import exceeds STARTUP_BUDGET_MS or pulls in a module
+the first page must not need (STARTUP_DEFERRED).
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+import benchmarks  # noqa: F401  (puts src/ on sys.path)
+from benchmarks.fake_llm import FakeBackend
+
+from utils import api_utils
+from utils.llm_backends import LocalBackend
+from agents.itinerary_agent import build_itinerary_prompt, repair_json
+from agents.validation_agent import validate, infer_trip_region
+from agents.budget_agent import optimize_budget, calculate_total, rebalance_many
+from orchestrator import run_agentic_pipeline
+from itinerary import Itinerary
+from utils.pdf_generator import generate_pdf, render_pdf
+
+TRIP_DAYS = [1, 3, 7, 14, 30, 60]
+
+# Cold start of the Streamlit script (Streamlit itself is most of the budget)
+STARTUP_SCRIPT = os.path.join(benchmarks.SRC, "app.py")
+STARTUP_BUDGET_MS = 700
+STARTUP_DEFERRED = ("planner_core", "numpy", "pyarrow", "reportlab", "google.generativeai")
+CITIES = ["Goa", "Kochi", "Munnar", "Jaipur", "Udaipur", "Varanasi"]
+
+
+def trip(days):
+    """
+    Domestic trip of `days` days over up to six cities, budgeted to pass pre-flight.
+    """
+    cities = CITIES[: max(1, min(len(CITIES), days // 5 or 1))]
+    return {
+        "source": "Delhi",
+        "destinations": cities,
+        "duration": days,
+        "budget": 4000 * days * 2,
+        "travelers": 2,
+    }
+
+
+def sample_plan_text(days):
+    return LocalBackend().generate(build_itinerary_prompt(trip(days)), "bench").text
+
+
+def measure(fn, repeat):
+    """
+    Run `fn` `repeat` times; returns timing stats in milliseconds.
+    """
+    fn()  # warm-up
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        "runs": repeat,
+        "min_ms": round(min(timings), 4),
+        "median_ms": round(statistics.median(timings), 4),
+        "max_ms": round(max(timings), 4),
+    }
+
+
+def bench_pipeline(backend, sizes, repeat):
+    results = {}
+    for days in sizes:
+        user = trip(days)
+        before = backend.calls
+        outcomes = {"ok": 0, "failed": 0, "crashed": 0}
+
+        def run():
+            try:
+                plan = run_agentic_pipeline(user["source"], user["destinations"], user["duration"],
+                                            user["budget"], user["travelers"])
+            except Exception:
+                outcomes["crashed"] += 1
+                return
+            outcomes["failed" if "error" in plan else "ok"] += 1
+
+        stats = measure(run, repeat)
+        stats["llm_calls_per_run"] = round((backend.calls - before) / (repeat + 1), 2)
+        stats.update(outcomes)
+        results[f"pipeline/{days}d"] = stats
+    return results
+
+
+def bench_micro(sizes, repeat):
+    results = {}
+    for days in sizes:
+        user = trip(days)
+        text = sample_plan_text(days)
+        plan = json.loads(text)
+
+        results[f"repair_json/clean/{days}d"] = measure(lambda: repair_json(text), repeat)
+        results[f"repair_json/fenced/{days}d"] = measure(
+            lambda: repair_json(FakeBackend.corrupt(text, "fence")), repeat)
+        results[f"repair_json/truncated/{days}d"] = measure(
+            lambda: repair_json(FakeBackend.corrupt(text, "truncate")), repeat)
+        results[f"validate/{days}d"] = measure(lambda: validate(plan, user), repeat)
+        results[f"infer_trip_region/{days}d"] = measure(
+            lambda: infer_trip_region(user["destinations"]), repeat)
+        results[f"itinerary/parse/{days}d"] = measure(lambda: Itinerary.from_dict(plan), repeat)
+        results[f"calculate_total/{days}d"] = measure(lambda: calculate_total(plan), repeat)
+        results[f"optimize_budget/{days}d"] = measure(
+            lambda: optimize_budget(json.loads(text), user["budget"]), repeat)
+        results[f"rebalance_many/100x/{days}d"] = measure(
+            lambda: rebalance_many([Itinerary.from_dict(plan) for _ in range(100)], [user] * 100), repeat)
+        results[f"render_pdf/{days}d"] = measure(lambda: render_pdf(plan), max(1, repeat // 10))
+        results[f"generate_pdf/cached/{days}d"] = measure(lambda: generate_pdf(plan), repeat)
+    return results
+
+
+def import_profile(script):
+    """
+    Run `script` in a fresh interpreter under -X importtime; returns
+    (total import ms, set of modules imported).
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", script],
+        capture_output=True, text=True, cwd=os.path.dirname(benchmarks.SRC),
+    )
+    total_us = 0
+    modules = set()
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        modules.add(name.strip())
+        if not name[1:].startswith(" "):  # top-level import
+            total_us += int(cumulative)
+    return total_us / 1000, modules
+
+
+def bench_startup(repeat):
+    timings = []
+    loaded = set()
+    for _ in range(repeat):
+        ms, modules = import_profile(STARTUP_SCRIPT)
+        timings.append(ms)
+        loaded |= modules
+    median = statistics.median(timings)
+    deferred_loaded = sorted(m for m in STARTUP_DEFERRED if m in loaded)
+    return {"startup/app_import": {
+        "runs": repeat,
+        "min_ms": round(min(timings), 4),
+        "median_ms": round(median, 4),
+        "max_ms": round(max(timings), 4),
+        "budget_ms": STARTUP_BUDGET_MS,
+        "deferred_loaded": deferred_loaded,
+        "within_budget": median <= STARTUP_BUDGET_MS and not deferred_loaded,
+    }}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ATLAS benchmarks")
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--latency", default="fixed:0", help="fake LLM latency spec")
+    parser.add_argument("--malformed", type=float, default=0.0, help="malformed-JSON rate (0-1)")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--quick", action="store_true", help="1/7/30-day trips only, fewer runs")
+    parser.add_argument("--only", choices=["pipeline", "micro", "startup"])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    sizes = [1, 7, 30] if args.quick else TRIP_DAYS
+    repeat = max(1, args.repeat // 4) if args.quick else args.repeat
+
+    backend = FakeBackend(args.latency, args.malformed, args.seed)
+    api_utils.set_backend(backend)
+
+    results = {}
+    if args.only in (None, "pipeline"):
+        results.update(bench_pipeline(backend, sizes, repeat))
+    if args.only in (None, "micro"):
+        results.update(bench_micro(sizes, repeat))
+    if args.only in (None, "startup"):
+        results.update(bench_startup(3 if args.quick else 5))
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "latency": args.latency,
+            "malformed_rate": args.malformed,
+            "repeat": repeat,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+    width = max(len(k) for k in results)
+    for name in sorted(results):
+        print(f"{name:<{width}}  median {results[name]['median_ms']:>10.3f} ms", file=sys.stderr)
+    print(f"\nWrote {args.out}", file=sys.stderr)
+
+    over = [name for name, r in results.items() if r.get("within_budget") is False]
+    for name in over:
+        r = results[name]
+        print(f"OVER BUDGET: {name} median {r['median_ms']} ms (budget {r['budget_ms']} ms), "
+              f"loaded at startup: {r['deferred_loaded'] or 'none'}", file=sys.stderr)
+    return 1 if over else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
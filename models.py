@@ -1,8 +1,10 @@
 import google.generativeai as genai
-from src.config import GEMINI_API_KEY
+from src.config import require_api_key
 
-genai.configure(api_key=GEMINI_API_KEY)
 
-models = genai.list_models()
-for m in models:
-    print(m.name, "-", m.supported_generation_methods)
+if __name__ == "__main__":
+    genai.configure(api_key=require_api_key())
+
+    models = genai.list_models()
+    for m in models:
+        print(m.name, "-", m.supported_generation_methods)
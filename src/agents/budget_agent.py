@@ -1,58 +1,148 @@
+from agents.validation_agent import REGION_PER_DAY_MIN, infer_trip_region
+from itinerary import Itinerary
+
+# Share of the regional per-traveler daily minimum reserved for each cost
+# category; together they add up to the minimum validate_request enforces
+FLOOR_SHARES = {"day": 0.35, "stay": 0.45, "transport": 0.20}
+
+# Totals are steered into [low, high] × budget
+TARGET_BAND = (0.5, 1.0)
+
+
 def calculate_total(plan):
     """
     Calculate an estimated total cost combining:
     - per-day costs
     - accommodation (multi-city or single)
     - transport
+    Accepts a plan dict or an already-parsed Itinerary (whose totals are cached).
     """
-    total = 0
+    if not isinstance(plan, Itinerary):
+        plan = Itinerary.from_dict(plan)
+    return plan.total
 
-    # Per-day costs
-    for day in plan.get("per_day_breakdown", []):
-        total += day.get("estimated_cost", 0)
 
-    # Multi-city accommodation
-    if "city_accommodations" in plan:
-        total += sum([ac.get("estimated_cost", 0) for ac in plan["city_accommodations"]])
-    else:
-        total += plan.get("accommodation", {}).get("estimated_cost", 0)
+def cost_floors(model, user_input):
+    """
+    Minimum cost for each of model.cost_entries(), from the trip region's
+    per-day minimum: each day, each stay (per night spent in that city)
+    and the transport block get their FLOOR_SHARES of it.
+    """
+    destinations = user_input.get("destinations", []) or []
+    duration = int(user_input.get("duration", 1) or 1)
+    travelers = user_input.get("travelers", 1) or 1
+    per_day = REGION_PER_DAY_MIN.get(infer_trip_region(destinations), 1500) * travelers
 
-    # Transport
-    total += plan.get("transport", {}).get("estimated_cost", 0)
+    day_floor = per_day * FLOOR_SHARES["day"]
+    stay_floor = per_day * FLOOR_SHARES["stay"]
 
-    return total
+    nights = {}
+    for day in model.days:
+        if isinstance(day.city, str):
+            nights[day.city.lower()] = nights.get(day.city.lower(), 0) + 1
+    stays = model.stay_entries()
+    even_share = duration / max(len(stays), 1)
 
+    floors = {}
+    for day in model.days:
+        floors[id(day)] = day_floor
+    for stay in stays:
+        city = stay.city.lower() if isinstance(stay.city, str) else None
+        floors[id(stay)] = stay_floor * nights.get(city, even_share)
+    if model.transport is not None:
+        floors[id(model.transport)] = per_day * FLOOR_SHARES["transport"] * duration
 
-def optimize_budget(plan, budget):
+    return [floors[id(entry)] for entry in model.cost_entries()]
+
+
+def solve_costs(costs, floors, groups, budgets):
     """
-    BudgetAgent tries to adjust costs softly.
-    No deep optimization — just normalization if wildly off.
+    Vectorized allocator over the cost entries of one or many plans.
+
+    `costs` / `floors` are flat arrays; `groups[i]` is the plan index of
+    entry i and `budgets[g]` that plan's budget. Per plan:
+    1) every cost is lifted to its floor,
+    2) a total above the band is brought down by shrinking only the part
+       of each cost above its floor (floors are kept when they fit),
+    3) a total below the band is scaled up proportionally (an all-zero
+       plan is spread by floor weights, or evenly).
+    Plans with no positive budget are only floored.
     """
+    import numpy as np  # deferred: only needed once a plan has been drafted
+
+    costs = np.asarray(costs, dtype=float)
+    floors = np.asarray(floors, dtype=float)
+    groups = np.asarray(groups, dtype=np.intp)
+    budgets = np.asarray(budgets, dtype=float)
+    n = len(budgets)
+
+    x = np.maximum(costs, floors)
+    total = np.bincount(groups, x, n)
+    floor_total = np.bincount(groups, floors, n)
+    count = np.bincount(groups, minlength=n)
 
-    total = calculate_total(plan)
+    active = budgets > 0
+    target = np.where(active, np.clip(total, budgets * TARGET_BAND[0], budgets * TARGET_BAND[1]), total)
 
-    # If cost massively exceeds budget → shrink estimates
-    if total > budget * 2:
-        factor = budget * 1.4 / total  # soften aggressively
-    elif total > budget * 1.3:
-        factor = budget * 1.1 / total  # small normalization
-    else:
-        factor = 1  # cost acceptable
+    # ---- Shrink: trim the slack above floors ----
+    slack = x - floors
+    slack_total = np.bincount(groups, slack, n)
+    room = np.maximum(target - floor_total, 0)
+    keep = np.divide(room, slack_total, out=np.zeros(n), where=slack_total > 0)
+    # Floors alone over target (pre-flight skipped): floors shrink too
+    floor_scale = np.divide(target, floor_total, out=np.ones(n), where=floor_total > target)
+    shrink = (total > target)[groups]
+    x = np.where(shrink, (floors + slack * keep[groups]) * floor_scale[groups], x)
 
-    # Apply normalization factor
-    for day in plan.get("per_day_breakdown", []):
-        cost = day.get("estimated_cost", 0)
-        day["estimated_cost"] = int(cost * factor)
+    # ---- Grow: proportional scale-up ----
+    grow = total < target
+    growth = np.divide(target, total, out=np.ones(n), where=total > 0)
+    weights = np.where(floor_total > 0, 0.0, 1.0)[groups] + floors
+    weight_total = np.bincount(groups, weights, n)
+    spread = np.divide(target, weight_total, out=np.zeros(n), where=weight_total > 0)
+    empty = (total == 0)[groups]
+    x = np.where(grow[groups] & ~empty, x * growth[groups], x)
+    x = np.where(grow[groups] & empty, weights * spread[groups], x)
 
-    if "city_accommodations" in plan:
-        for ac in plan["city_accommodations"]:
-            cost = ac.get("estimated_cost", 0)
-            ac["estimated_cost"] = int(cost * factor)
-    else:
-        acc_cost = plan.get("accommodation", {}).get("estimated_cost", 0)
-        plan["accommodation"]["estimated_cost"] = int(acc_cost * factor)
+    return np.floor(x).astype(np.int64), count
 
-    trans_cost = plan.get("transport", {}).get("estimated_cost", 0)
-    plan["transport"]["estimated_cost"] = int(trans_cost * factor)
 
-    return plan
+def rebalance_many(models, user_inputs, use_floors=True):
+    """
+    Bulk mode: rebalance many Itineraries in one vectorized pass.
+    `user_inputs[i]` (destinations, duration, budget, travelers) belongs to
+    `models[i]`. Models are updated in place and returned.
+    """
+    costs, floors, groups, budgets = [], [], [], []
+    for g, (model, user) in enumerate(zip(models, user_inputs)):
+        entries = model.cost_entries()
+        costs.extend(e.estimated_cost for e in entries)
+        floors.extend(cost_floors(model, user) if use_floors else [0] * len(entries))
+        groups.extend([g] * len(entries))
+        budgets.append(user.get("budget", 0) or 0)
+
+    if not budgets:
+        return models
+
+    solved, counts = solve_costs(costs, floors, groups, budgets)
+    start = 0
+    for model, count in zip(models, counts):
+        model.set_costs(solved[start:start + count].tolist())
+        start += count
+    return models
+
+
+def optimize_budget(plan, budget, user_input=None):
+    """
+    BudgetAgent rebalances costs locally instead of asking for a new plan:
+    per-day, per-city stay and transport costs are lifted to their regional
+    floors and the total is steered into TARGET_BAND of the budget.
+
+    An Itinerary is updated in place and returned; a plan dict is parsed,
+    rebalanced and returned as a new dict. Missing sections (e.g. no
+    transport) are simply left out. Without `user_input` no floors apply.
+    """
+    model = plan if isinstance(plan, Itinerary) else Itinerary.from_dict(plan)
+    rebalance_many([model], [dict(user_input or {}, budget=budget)], use_floors=user_input is not None)
+
+    return model if model is plan else model.to_dict()
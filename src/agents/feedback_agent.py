@@ -1,12 +1,115 @@
-def refine_state(state, errors):
-    plan = state["plan"]
+import re
+
+from agents.itinerary_agent import allocate_days, day_cities
+from utils.tracing import METRICS, current_trace
+
+_INDEX = re.compile(r"\[(\d+)\]")
+
+
+def _index(path):
+    match = _INDEX.search(path)
+    return int(match.group(1)) if match else None
+
+
+# ---- Local repairs ----
+# Each repair fixes every issue of one code in place on a plan dict, without
+# an LLM call, and returns True if it could. Issues with other codes (no
+# activities, missing accommodation, ...) are left to regeneration.
+
+def _renumber_days(plan, issues, user):
+    for n, day in enumerate(plan.get("per_day_breakdown", []), 1):
+        day["day"] = n
+    return True
+
+
+def _fill_day_cities(plan, issues, user):
+    destinations = user.get("destinations") or []
+    if not destinations:
+        return False
+    duration = max(int(user.get("duration") or 1), len(destinations))
+    cities = day_cities(allocate_days(destinations, duration))
+    days = plan["per_day_breakdown"]
+    for issue in issues:
+        day = days[_index(issue.path)]
+        number = day.get("day")
+        day["city"] = cities.get(number, destinations[-1]) if isinstance(number, int) else destinations[-1]
+    return True
+
+
+def _clamp_costs(plan, issues, user):
+    # Negative or unusable costs become 0 (or the number a numeric string
+    # spells); the budget agent then lifts them to their regional floor
+    for issue in issues:
+        section = issue.path.split("[")[0].split(".")[0]
+        if section == "transport":
+            entry = plan["transport"]
+        else:
+            entry = plan[section][_index(issue.path)]
+        cost = entry.get("estimated_cost")
+        try:
+            cost = float(cost)
+        except (TypeError, ValueError):
+            cost = 0
+        entry["estimated_cost"] = max(int(cost), 0) if cost == cost else 0  # NaN → 0
+    return True
 
-    # Simple fixes for now (quickest agentic mode)
-    if "duration_mismatch" in errors:
-        plan["duration"] = state["user"]["duration"]
 
-    if "missing_per_day_breakdown" in errors:
-        plan["per_day_breakdown"] = []
+def _dedupe_stays(plan, issues, user):
+    # The first stay listed for a city is kept
+    for i in sorted((_index(issue.path) for issue in issues), reverse=True):
+        del plan["city_accommodations"][i]
+    return True
 
-    state["plan"] = plan
+
+def _reconcile_duration(plan, issues, user):
+    if not user.get("duration"):
+        return False
+    plan["duration"] = user["duration"]
+    return True
+
+
+# Applied in this order: days are renumbered before their cities are looked
+# up, and duplicate stays are removed last so cost paths stay valid
+REPAIRS = {
+    "day_numbering": _renumber_days,
+    "missing_day_city": _fill_day_cities,
+    "invalid_day_cost": _clamp_costs,
+    "invalid_cost": _clamp_costs,
+    "duration_mismatch": _reconcile_duration,
+    "duplicate_stay": _dedupe_stays,
+}
+
+
+def repair_plan(plan, issues, user_input):
+    """
+    Apply every local repair that applies to `issues` (Issues from
+    validate_plan, with paths into this plan dict). The plan is changed in
+    place and returned with the list of codes that were repaired.
+    """
+    by_code = {}
+    for issue in issues:
+        by_code.setdefault(issue.code, []).append(issue)
+
+    repaired = []
+    for code, repair in REPAIRS.items():
+        if code in by_code and repair(plan, by_code[code], user_input):
+            repaired.append(code)
+            METRICS.inc("atlas_local_repairs_total", {"code": code}, value=len(by_code[code]))
+
+    tr = current_trace()
+    if tr is not None and repaired:
+        tr.incr("local_repairs", sum(len(by_code[code]) for code in repaired))
+    return plan, repaired
+
+
+def repairable(issues):
+    return any(issue.code in REPAIRS for issue in issues)
+
+
+def refine_state(state, errors):
+    """
+    FeedbackAgent: fix what can be fixed locally in state["plan"] for the
+    given validation Issues; state["repaired"] lists the repaired codes.
+    """
+    state["plan"], state["repaired"] = repair_plan(state["plan"], errors, state["user"])
     return state
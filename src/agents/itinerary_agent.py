@@ -1,36 +1,91 @@
-from utils.api_utils import call_llm
-import json, re
+from utils.api_utils import call_llm, stream_llm, evict_cached
+from utils.json_stream import IncrementalJSONParser
+from utils.fragment_store import get_store
+from utils.tracing import METRICS, current_trace, propagate
+from config import FANOUT_MAX_WORKERS, LLM_JSON_MODE
+from itinerary import response_schema, schema_skeleton
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import copy, json
 
-def repair_json(output):
+# Streamed array → fragment kind handed to on_fragment callbacks
+STREAMED_KEYS = {
+    "per_day_breakdown": "day",
+    "city_accommodations": "hotel",
+}
+
+# Top-level keys asked for by the per-city and trip-glue calls
+FRAGMENT_KEYS = ("per_day_breakdown", "city_accommodations")
+GLUE_KEYS = ("accommodation", "transport", "top_places", "summary")
+
+
+def structured_output(keys=None):
     """
-    Extract & repair malformed JSON using regex.
+    (generation_config, format instructions) for a plan-shaped answer.
+    In JSON mode the schema travels as Gemini's response_schema and the
+    prompt needs no skeleton; otherwise a compact skeleton derived from
+    the same schema is appended to the prompt.
     """
-    match = re.search(r"\{[\s\S]*\}", output)
-    if match:
-        try:
-            return json.loads(match.group(0))
-        except:
-            pass
-    return {"error": "invalid_json", "raw": output}
+    schema = response_schema(keys)
+    if LLM_JSON_MODE:
+        return {"response_mime_type": "application/json", "response_schema": schema}, ""
+    skeleton = json.dumps(schema_skeleton(schema), ensure_ascii=False)
+    return None, f"Return ONLY valid JSON with this structure:\n{skeleton}\nNO markdown. NO commentary."
+
+
+PLAN_CONFIG, PLAN_FORMAT = structured_output()
+FRAGMENT_CONFIG, FRAGMENT_FORMAT = structured_output(FRAGMENT_KEYS)
+GLUE_CONFIG, GLUE_FORMAT = structured_output(GLUE_KEYS)
 
 
-def generate_itinerary(user):
+def trip_facts(user, destination=None, **overrides):
     """
-    Generate a multi-city itinerary with:
-    - per-city day allocation
-    - per-city accommodation recommendations
-    - strict JSON output
+    One-line JSON of the trip facts every prompt repeats.
     """
-    source = user.get("source", "")
-    destinations = user.get("destinations", [])
-    duration = int(user.get("duration", 1))
-    budget = user.get("budget", 0)
-    travelers = user.get("travelers", 1)
+    facts = {}
+    if destination:
+        facts["destination"] = destination
+    facts.update(
+        duration=int(user.get("duration", 1)),
+        total_budget=user.get("budget", 0),
+        travelers=user.get("travelers", 1),
+    )
+    facts.update(overrides)
+    return json.dumps(facts, ensure_ascii=False)
 
-    if not destinations:
-        destinations = ["Unknown City"]
 
-    # Day Allocation
+def repair_json(output, keys=None):
+    """
+    Recover a JSON plan from raw model output in one linear pass.
+    Handles markdown fences, trailing text and commas, and truncated output
+    (unterminated arrays/objects are closed and a partial trailing element
+    is dropped). What is still missing is left to validation / refinement.
+
+    `keys` are the top-level keys the answer was asked for (default: the
+    whole plan); which of them arrived intact is recorded on the trace.
+    """
+    parser = IncrementalJSONParser()
+    plan = parser.feed_all(output)
+    ok = isinstance(plan, dict) and bool(plan)
+    missing = [k for k in response_schema(keys)["properties"] if k not in parser.intact_keys]
+
+    METRICS.inc("atlas_json_repairs_total", {"result": "recovered" if ok else "failed"})
+    for key in missing:
+        METRICS.inc("atlas_json_missing_keys_total", {"key": key})
+    tr = current_trace()
+    if tr is not None:
+        tr.incr("json_repairs" if ok else "json_parse_failures")
+        tr.set(json_intact_keys=list(parser.intact_keys), json_missing_keys=missing)
+
+    if ok:
+        return plan
+    return {"error": "invalid_json", "raw": output}
+
+
+def allocate_days(destinations, duration):
+    """
+    Split `duration` days across destinations in order; earlier cities
+    take the remainder. Returns [(city, days), ...].
+    """
     n = len(destinations)
     base = duration // n
     extra = duration % n
@@ -39,70 +94,450 @@ def generate_itinerary(user):
     for i, city in enumerate(destinations):
         days = base + (1 if i < extra else 0)
         allocation.append((city, days))
+    return allocation
+
+
+def day_cities(allocation):
+    """
+    Map day number → city for a day allocation.
+    """
+    mapping = {}
+    day = 1
+    for city, days in allocation:
+        for _ in range(days):
+            mapping[day] = city
+            day += 1
+    return mapping
+
 
+def build_itinerary_prompt(user):
+    """
+    Full-trip prompt used by generate_itinerary / stream_itinerary.
+    """
+    source = user.get("source", "")
+    destinations = user.get("destinations", [])
+    duration = int(user.get("duration", 1))
+
+    if not destinations:
+        destinations = ["Unknown City"]
+
+    allocation = allocate_days(destinations, duration)
     alloc_text = "\n".join([f"- {city}: {d} day(s)" for city, d in allocation])
     dest_display = ", ".join(destinations)
 
-    # ULTRA PRO PROMPT — per-city accommodations
     prompt = f"""
 You are ATLAS, a professional multi-destination travel planner AI.
-
-Generate an itinerary ONLY in valid JSON using this EXACT structure:
-
-{{
-  "destination": "{source} → {dest_display}",
-  "duration": {duration},
-  "total_budget": {budget},
-  "travelers": {travelers},
-
-  "per_day_breakdown": [
-    {{
-      "day": 1,
-      "city": "City Name",
-      "title": "Short title for the day",
-      "activities": ["Activity 1", "Activity 2"],
-      "estimated_cost": 0
-    }}
-  ],
-
-  "city_accommodations": [
-    {{
-      "city": "City Name",
-      "hotel": "Hotel Name (not chain of multiple hotels)",
-      "type": "Hotel/Hostel Category",
-      "estimated_cost": 0
-    }}
-  ],
-
-  "accommodation": {{
-    "type": "General accommodation category",
-    "example": "Overall example stay",
-    "estimated_cost": 0
-  }},
-
-  "transport": {{
-    "recommended_transport": "",
-    "estimated_cost": 0
-  }},
-
-  "top_places": ["Place 1", "Place 2"],
-  "summary": "Short summary paragraph."
-}}
-
-IMPORTANT RULES:
-- DO NOT mix hotels. ONE hotel per city.
-- If a hotel name includes parentheses, ensure they do NOT contain another city.
-- For each destination in this exact list: {dest_display}, generate EXACTLY one hotel.
-- Distribute days exactly as follows:
+Plan this trip.
+Trip facts: {trip_facts(user, f"{source} → {dest_display}")}
+Day allocation:
 {alloc_text}
-
-RETURN ONLY JSON. NO markdown. NO commentary.
+Rules:
+- One per_day_breakdown entry per day, following the allocation.
+- EXACTLY one hotel in city_accommodations for each of: {dest_display}. A hotel name must not mention another city.
+- Costs are whole INR amounts.
+{PLAN_FORMAT}
 """
+    return prompt
+
+
+def generate_itinerary(user, fresh=False, on_fragment=None):
+    """
+    Generate a multi-city itinerary with:
+    - per-city day allocation
+    - per-city accommodation recommendations
+    - strict JSON output
+
+    `fresh=True` bypasses the response cache (used by refinement loops).
+    `on_fragment(kind, entry)` switches to streaming and is called with
+    ("day", entry) / ("hotel", entry) as each entry becomes parseable.
+    """
+    if on_fragment is not None:
+        for kind, entry in stream_itinerary(user, fresh=fresh):
+            if kind == "plan":
+                return entry
+            on_fragment(kind, entry)
 
-    raw = call_llm(prompt)
+    prompt = build_itinerary_prompt(user)
+    raw = call_llm(prompt, PLAN_CONFIG, use_cache=not fresh, purpose="itinerary")
 
     # Try direct JSON parsing
+    try:
+        plan = json.loads(raw)
+    except:
+        plan = repair_json(raw)
+    if not isinstance(plan, dict):
+        # Valid JSON, but a list / string / number rather than a plan
+        plan = {"error": "invalid_json", "raw": raw}
+
+    # Never keep serving an answer we could not parse
+    if "error" in plan:
+        evict_cached(prompt, PLAN_CONFIG)
+    return plan
+
+
+def stream_itinerary(user, fresh=False):
+    """
+    Streaming generate_itinerary. Yields ("day", entry) and ("hotel", entry)
+    as soon as each per_day_breakdown / city_accommodations entry is
+    complete, then ("plan", plan) with the fully parsed (or error) result.
+    """
+    prompt = build_itinerary_prompt(user)
+    parser = IncrementalJSONParser(watch=STREAMED_KEYS)
+    chunks = []
+
+    for chunk in stream_llm(prompt, PLAN_CONFIG, use_cache=not fresh, purpose="itinerary"):
+        chunks.append(chunk)
+        for key, entry in parser.feed(chunk):
+            yield STREAMED_KEYS[key], entry
+
+    # The parser has already seen every character; no second parse needed
+    plan = parser.result()
+    if not isinstance(plan, dict) or not plan:
+        plan = {"error": "invalid_json", "raw": "".join(chunks)}
+        evict_cached(prompt, PLAN_CONFIG)
+    yield "plan", plan
+
+
+def _parse(raw, keys=None):
     try:
         return json.loads(raw)
     except:
-        return repair_json(raw)
+        return repair_json(raw, keys)
+
+
+def generate_city_fragment(city, days, budget, travelers, fresh=False):
+    """
+    Days + hotel for ONE city, numbered from day 1.
+    The prompt depends only on the city and its share of the trip, so the
+    same stop in different trips shares a cache entry.
+
+    Returns {"per_day_breakdown": [...], "hotel": {...}} or an error dict.
+    """
+    prompt = f"""
+You are ATLAS, a professional travel planner AI.
+Plan ONLY the {city} leg of a longer trip.
+Trip facts: {trip_facts({"duration": days, "budget": budget, "travelers": travelers})}
+Day allocation:
+- {city}: {days} day(s)
+Rules: EXACTLY {days} per_day_breakdown entries numbered from day 1, and EXACTLY one hotel in city_accommodations. Costs are whole INR amounts.
+{FRAGMENT_FORMAT}
+"""
+    part = _parse(call_llm(prompt, FRAGMENT_CONFIG, use_cache=not fresh, purpose="city_fragment"), FRAGMENT_KEYS)
+    if not isinstance(part, dict):
+        # A bare list / string reply is as unusable as a malformed one
+        part = {}
+    days_out = part.get("per_day_breakdown")
+    stays = part.get("city_accommodations") or []
+
+    if not isinstance(days_out, list) or not days_out:
+        evict_cached(prompt, FRAGMENT_CONFIG)
+        return {"error": "invalid_city_fragment", "city": city}
+
+    hotel = stays[0] if stays and isinstance(stays[0], dict) else {}
+    return {"per_day_breakdown": days_out[:days], "hotel": hotel}
+
+
+def generate_trip_glue(user):
+    """
+    Lightweight call for the parts that span cities:
+    transport, general accommodation, top places and summary.
+    """
+    source = user.get("source", "")
+    destinations = user.get("destinations", []) or ["Unknown City"]
+
+    prompt = f"""
+You are ATLAS, a professional multi-destination travel planner AI.
+Give the trip-wide details (general accommodation, transport, top places, summary) for this trip.
+Trip facts: {trip_facts(user, f"{source} → {', '.join(destinations)}")}
+{GLUE_FORMAT}
+"""
+    glue = _parse(call_llm(prompt, GLUE_CONFIG, purpose="trip_glue"), GLUE_KEYS)
+    if not isinstance(glue, dict):
+        glue = {"error": "invalid_json"}
+    if "error" in glue:
+        evict_cached(prompt, GLUE_CONFIG)
+    return glue
+
+
+def merge_fragments(user, allocation, parts, glue):
+    """
+    Deterministically assemble per-city fragments into one plan:
+    days are renumbered across the trip and tagged with their city.
+    """
+    source = user.get("source", "")
+    destinations = [city for city, _ in allocation]
+
+    per_day = []
+    stays = []
+    for (city, _), part in zip(allocation, parts):
+        for entry in part["per_day_breakdown"]:
+            if not isinstance(entry, dict):
+                continue
+            per_day.append(dict(entry, day=len(per_day) + 1, city=city))
+        stays.append(dict(part["hotel"], city=city))
+
+    plan = {
+        "destination": f"{source} → {', '.join(destinations)}",
+        "duration": int(user.get("duration", 1)),
+        "total_budget": user.get("budget", 0),
+        "travelers": user.get("travelers", 1),
+        "per_day_breakdown": per_day,
+        "city_accommodations": stays,
+    }
+    if isinstance(glue, dict) and "error" not in glue:
+        for key in ("accommodation", "transport", "top_places", "summary"):
+            if key in glue:
+                plan[key] = glue[key]
+    return plan
+
+
+def plan_city(user, city, days, fresh=False):
+    """
+    Days + hotel for one city of `user`'s trip: from the fragment store when
+    possible (unless `fresh`), otherwise generated (retried once if
+    malformed) and stored if it passes the fragment checks.
+    """
+    duration = int(user.get("duration", 1))
+    budget = user.get("budget", 0) or 0
+    travelers = user.get("travelers", 1)
+    share = int(budget * days / max(duration, 1))
+    store = get_store()
+
+    # Reuse a validated fragment for this city / length / tier when we have one
+    if store is not None and not fresh:
+        part = store.get(city, days, share, travelers)
+        if part is not None:
+            return part
+    part = generate_city_fragment(city, days, share, travelers, fresh=fresh)
+    if "error" in part:
+        part = generate_city_fragment(city, days, share, travelers, fresh=True)
+    if store is not None and "error" not in part:
+        store.put(city, days, share, travelers, part)
+    return part
+
+
+def first_days(allocation):
+    """
+    First day number of each city in an allocation.
+    """
+    offsets = []
+    start = 1
+    for _, days in allocation:
+        offsets.append(start)
+        start += days
+    return offsets
+
+
+def emit_city(on_fragment, part, city, first_day):
+    """
+    Hand one city's days and hotel to an on_fragment callback, numbered
+    as they will appear in the merged plan.
+    """
+    for n, entry in enumerate(part["per_day_breakdown"]):
+        if isinstance(entry, dict):
+            on_fragment("day", dict(entry, day=first_day + n, city=city))
+    on_fragment("hotel", dict(part["hotel"], city=city))
+
+
+def compose_itinerary(user, allocation, parts, glue):
+    """
+    Merge per-city parts, or report the cities whose part failed.
+    """
+    failed = [p["city"] for p in parts if "error" in p]
+    if failed:
+        return {"error": "invalid_json", "failed_cities": failed}
+    return merge_fragments(user, allocation, parts, glue)
+
+
+def generate_itinerary_parallel(user, fresh=False, on_fragment=None, max_workers=None):
+    """
+    Fan-out variant of generate_itinerary for multi-city trips: each city's
+    days + hotel are generated concurrently alongside one glue call, then
+    merged locally. Wall-clock time tracks the slowest city, and a malformed
+    city is retried on its own instead of failing the whole plan. Cities
+    found in the fragment store cost no LLM call (unless `fresh`).
+
+    `on_fragment` is called from the calling thread as each city finishes.
+    """
+    destinations = user.get("destinations", []) or ["Unknown City"]
+    duration = int(user.get("duration", 1))
+
+    allocation = allocate_days(destinations, duration)
+    workers = max_workers or FANOUT_MAX_WORKERS
+    offsets = first_days(allocation)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        glue_future = pool.submit(propagate(generate_trip_glue), user)
+        futures = {
+            pool.submit(propagate(plan_city), user, city, days, fresh): i
+            for i, (city, days) in enumerate(allocation)
+        }
+        parts = [None] * len(allocation)
+
+        for future in as_completed(futures):
+            i = futures[future]
+            parts[i] = part = future.result()
+            if on_fragment is not None and "error" not in part:
+                emit_city(on_fragment, part, allocation[i][0], offsets[i])
+
+        glue = glue_future.result()
+
+    return compose_itinerary(user, allocation, parts, glue)
+
+
+def _city_shares(user):
+    """
+    [(city, days, budget share)] for a trip, as used for fragment keys.
+    """
+    duration = int(user.get("duration", 1))
+    budget = user.get("budget", 0) or 0
+    destinations = user.get("destinations", []) or ["Unknown City"]
+    return [
+        (city, days, int(budget * days / max(duration, 1)))
+        for city, days in allocate_days(destinations, duration)
+    ]
+
+
+def cached_cities(user):
+    """
+    Destinations whose fragment is already in the store.
+    """
+    store = get_store()
+    if store is None:
+        return []
+    travelers = user.get("travelers", 1)
+    return [city for city, days, share in _city_shares(user) if store.has(city, days, share, travelers)]
+
+
+def harvest_fragments(plan, user):
+    """
+    Split an accepted plan into per-city fragments and store the ones that
+    pass the fragment checks, so later trips through these cities can be
+    composed without generating them again. Returns how many were stored.
+    """
+    store = get_store()
+    if store is None:
+        return 0
+
+    travelers = user.get("travelers", 1)
+    shares = _city_shares(user)
+    by_day = day_cities([(city, days) for city, days, _ in shares])
+    hotels = {
+        str(ac.get("city", "")).lower(): ac
+        for ac in plan.get("city_accommodations") or []
+        if isinstance(ac, dict)
+    }
+
+    stored = 0
+    for city, days, share in shares:
+        entries = [
+            d for d in plan.get("per_day_breakdown") or []
+            if isinstance(d, dict) and by_day.get(d.get("day")) == city
+        ]
+        # Store days renumbered from 1, as generate_city_fragment returns them
+        fragment = {
+            "per_day_breakdown": [dict(d, day=n) for n, d in enumerate(entries, 1)],
+            "hotel": hotels.get(city.lower()),
+        }
+        stored += store.put(city, days, share, travelers, fragment)
+    return stored
+
+
+def regenerate_fragments(plan, user, targets):
+    """
+    Regenerate only the failed parts of an existing plan and splice them in.
+
+    `targets` comes from validation_agent.locate_failures:
+    {"days": [day numbers], "cities": [city names], "transport": bool}
+
+    Returns the patched plan, or an error dict if the fragment response
+    could not be parsed.
+    """
+    source = user.get("source", "")
+    destinations = user.get("destinations", []) or ["Unknown City"]
+    duration = int(user.get("duration", 1))
+
+    allocation = allocate_days(destinations, duration)
+    alloc_text = "\n".join([f"- {city}: {d} day(s)" for city, d in allocation])
+    by_day = day_cities(allocation)
+
+    wanted = []
+    keys = []
+    if targets.get("days"):
+        day_list = ", ".join(f"Day {d} ({by_day.get(d, 'any city')})" for d in targets["days"])
+        wanted.append(f"- per_day_breakdown: entries ONLY for {day_list}, each with a non-empty activities list")
+        keys.append("per_day_breakdown")
+    if targets.get("cities"):
+        wanted.append(f"- city_accommodations: ONE hotel for each of {', '.join(targets['cities'])}")
+        keys.append("city_accommodations")
+    if targets.get("transport"):
+        wanted.append("- transport")
+        keys.append("transport")
+    wanted_text = "\n".join(wanted)
+    config, output_format = structured_output(keys)
+
+    prompt = f"""
+You are ATLAS, a professional multi-destination travel planner AI.
+An itinerary for this trip is already written.
+Trip facts: {trip_facts(user, f"{source} → {', '.join(destinations)}")}
+Day allocation for the whole trip:
+{alloc_text}
+Regenerate ONLY these parts:
+{wanted_text}
+{output_format}
+"""
+
+    fragment = _parse(call_llm(prompt, config, use_cache=False, purpose="repair"), keys)
+    if not isinstance(fragment, dict):
+        return {"error": "invalid_json"}
+    if "error" in fragment:
+        return fragment
+
+    return splice_fragments(plan, fragment, targets)
+
+
+def _section(plan, key):
+    value = plan.get(key) or []
+    return value if isinstance(value, list) else []
+
+
+def splice_fragments(plan, fragment, targets):
+    """
+    Replace the targeted days / hotels / transport in a copy of `plan`.
+    Anything in `fragment` that was not asked for is ignored, and so are
+    sections that are not lists.
+    """
+    patched = copy.deepcopy(plan)
+
+    days = set(targets.get("days") or [])
+    if days:
+        fresh = {
+            d.get("day"): d for d in _section(fragment, "per_day_breakdown")
+            if isinstance(d, dict) and isinstance(d.get("day"), int) and d["day"] in days
+        }
+        kept = [
+            d for d in _section(patched, "per_day_breakdown")
+            if not (isinstance(d, dict) and d.get("day") in fresh)
+        ]
+        patched["per_day_breakdown"] = sorted(
+            kept + list(fresh.values()),
+            key=lambda d: d.get("day", 0) if isinstance(d, dict) else 0,
+        )
+
+    cities = {c.lower() for c in targets.get("cities") or []}
+    if cities:
+        fresh = {}
+        for ac in _section(fragment, "city_accommodations"):
+            city = str(ac.get("city", "")).lower() if isinstance(ac, dict) else ""
+            if city in cities and city not in fresh:
+                fresh[city] = ac
+        kept = [
+            ac for ac in _section(patched, "city_accommodations")
+            if not (isinstance(ac, dict) and str(ac.get("city", "")).lower() in fresh)
+        ]
+        patched["city_accommodations"] = kept + list(fresh.values())
+
+    if targets.get("transport") and isinstance(fragment.get("transport"), dict):
+        patched["transport"] = fragment["transport"]
+
+    return patched
@@ -1,56 +1,38 @@
 # agents/validation_agent.py
+from itinerary import Issue, Itinerary
+from utils.gazetteer import region_of
+
 
 def infer_trip_region(destinations):
     """
-    Very simple heuristic to classify trip type based on destination names.
-    If any destination matches long-haul keywords → long_haul
-    Else if any matches Asia/Middle-East → asia
-    Else → domestic (India assumed as base)
+    Classify the trip from its destinations using the packaged gazetteer.
+    If any destination is long-haul → long_haul
+    Else if any is in Asia/Middle-East → asia
+    Else → domestic (India assumed as base; unknown places count as domestic)
     """
-    if not destinations:
-        return "domestic"
-
-    long_haul_keywords = {
-        # Countries / regions
-        "canada", "usa", "united states", "america", "uk", "england", "britain",
-        "london", "france", "paris", "germany", "berlin", "italy", "rome",
-        "spain", "madrid", "barcelona", "switzerland", "zurich", "geneva",
-        "netherlands", "amsterdam", "belgium", "australia", "sydney", "melbourne",
-        "new zealand", "auckland", "toronto", "vancouver", "los angeles",
-        "new york", "san francisco", "boston", "chicago", "mauritius"
-    }
+    regions = {region_of(dest) for dest in destinations or []}
 
-    asia_keywords = {
-        "singapore", "thailand", "bangkok", "phuket", "krabi",
-        "malaysia", "kuala lumpur", "indonesia", "bali",
-        "vietnam", "hanoi", "ho chi minh",
-        "sri lanka", "colombo",
-        "nepal", "kathmandu",
-        "bhutan",
-        "maldives",
-        "qatar", "doha",
-        "dubai", "uae", "abu dhabi",
-        "hong kong", "japan", "tokyo", "osaka",
-        "china", "beijing", "shanghai"
-    }
-
-    # First pass: long-haul detection
-    for dest in destinations:
-        d = dest.lower()
-        if any(kw in d for kw in long_haul_keywords):
-            return "long_haul"
+    if "long_haul" in regions:
+        return "long_haul"
+    if "asia" in regions:
+        return "asia"
+    return "domestic"
 
-    # Second pass: Asia / nearby
-    for dest in destinations:
-        d = dest.lower()
-        if any(kw in d for kw in asia_keywords):
-            return "asia"
 
-    # Fallback: assume domestic (India)
-    return "domestic"
+# Minimum realistic spend per traveler per day (INR), by trip region
+REGION_PER_DAY_MIN = {
+    "domestic": 1500,
+    "asia": 6000,
+    "long_haul": 15000,
+}
 
 
-def validate(plan, user_input):
+def validate_request(user_input):
+    """
+    Pre-flight stage: checks that depend only on the user's inputs.
+    Runs before any LLM call so doomed requests are rejected immediately.
+    Returns (ok, [Issue]).
+    """
     errors = []
 
     budget = user_input.get("budget", 0) or 0
@@ -60,44 +42,109 @@ def validate(plan, user_input):
 
     # ---- Basic numeric sanity ----
     if budget <= 0 or duration <= 0 or travelers <= 0:
-        errors.append("Invalid numeric inputs (budget, duration, or travelers).")
+        errors.append(Issue("invalid_inputs", "error", "",
+                            "Invalid numeric inputs (budget, duration, or travelers)."))
 
     # ---- City/day feasibility ----
     if len(destinations) > duration:
-        errors.append("Too many destinations for the given number of days.")
+        errors.append(Issue("too_many_destinations", "error", "destinations",
+                            "Too many destinations for the given number of days."))
 
     # ---- Budget realism by region ----
     trip_type = infer_trip_region(destinations)
-
-    per_day_min = {
-        "domestic": 1500,
-        "asia": 6000,
-        "long_haul": 15000,
-    }.get(trip_type, 1500)
+    per_day_min = REGION_PER_DAY_MIN.get(trip_type, 1500)
 
     required_min = per_day_min * duration * travelers
 
     if budget < required_min:
-        errors.append(
+        errors.append(Issue(
+            "budget_too_low", "error", "budget",
             f"Budget too low for a {trip_type.replace('_', ' ')} trip. "
             f"Minimum expected: ₹{required_min:,} for {duration} day(s) × {travelers} traveler(s)."
-        )
-
-    # ---- Structural checks on the plan ----
-    if not plan.get("city_accommodations"):
-        errors.append("Missing per-city accommodation details.")
-
-    per_day = plan.get("per_day_breakdown", [])
-    if not isinstance(per_day, list):
-        errors.append("Invalid per-day breakdown structure.")
-    else:
-        for day in per_day:
-            day_num = day.get("day", "?")
-            if not day.get("activities"):
-                errors.append(f"Day {day_num} has no activities listed.")
-            est = day.get("estimated_cost", 0)
-            if est is None or est < 0:
-                errors.append(f"Day {day_num} has invalid estimated cost.")
+        ))
 
-    # ---- Final verdict ----
     return (len(errors) == 0, errors)
+
+
+def validate_plan(plan, user_input):
+    """
+    Post-generation stage: structural checks on the generated plan.
+    Accepts a plan dict or an Itinerary; the structural checks run while the
+    plan is parsed (see Itinerary.from_dict), together with the cost totals,
+    and the ones that need the request are added here.
+
+    Returns (valid, [Issue]): the plan is valid when no issue has severity
+    "error"; warnings are reported for the feedback agent to repair.
+    """
+    model = plan if isinstance(plan, Itinerary) else Itinerary.from_dict(plan)
+    issues = list(model.issues)
+
+    duration = user_input.get("duration")
+    if duration and model.extra.get("duration") != duration:
+        issues.append(Issue(
+            "duration_mismatch", "warning", "duration",
+            f"Plan duration {model.extra.get('duration')} does not match the requested {duration} day(s).",
+        ))
+
+    for i, day in enumerate(model.days):
+        if not isinstance(day.city, str) or not day.city.strip():
+            issues.append(Issue("missing_day_city", "warning", f"per_day_breakdown[{i}].city",
+                                f"Day {day.day if day.day is not None else '?'} has no city."))
+
+    return (not any(issue.severity == "error" for issue in issues), issues)
+
+
+def validate(plan, user_input):
+    """
+    Both stages together (input feasibility + plan structure).
+    Returns (valid, [Issue]).
+    """
+    _, errors = validate_request(user_input)
+    _, plan_errors = validate_plan(plan, user_input)
+    errors += plan_errors
+
+    # ---- Final verdict ----
+    return (not any(issue.severity == "error" for issue in errors), errors)
+
+
+def locate_failures(plan, user_input):
+    """
+    Work out which parts of a plan need regenerating.
+
+    Returns {"days": [...], "cities": [...], "transport": bool}, or None when
+    the plan is too broken to patch and should be regenerated in full.
+    Empty lists / False everywhere means nothing structural is wrong.
+    """
+    per_day = plan.get("per_day_breakdown")
+    if not isinstance(per_day, list) or not per_day:
+        return None
+
+    duration = user_input.get("duration", 1) or 1
+    destinations = user_input.get("destinations", []) or []
+
+    # ---- Days: missing, empty or badly costed ----
+    bad_days = set()
+    seen = set()
+    for day in per_day:
+        if not isinstance(day, dict) or not isinstance(day.get("day"), int):
+            return None
+        seen.add(day["day"])
+        est = day.get("estimated_cost", 0)
+        if not day.get("activities") or est is None or not isinstance(est, (int, float)) or est < 0:
+            bad_days.add(day["day"])
+    bad_days.update(d for d in range(1, duration + 1) if d not in seen)
+
+    # ---- Hotels: one per destination ----
+    stays = plan.get("city_accommodations") or []
+    covered = {
+        str(ac.get("city", "")).lower()
+        for ac in stays
+        if isinstance(ac, dict) and ac.get("hotel")
+    }
+    bad_cities = [c for c in destinations if c.lower() not in covered]
+
+    # ---- Transport block ----
+    transport = plan.get("transport")
+    bad_transport = not isinstance(transport, dict) or not transport.get("recommended_transport")
+
+    return {"days": sorted(bad_days), "cities": bad_cities, "transport": bad_transport}
@@ -1,9 +1,14 @@
 import streamlit as st
 import json
-from planner_core import generate_plan
-from utils.pdf_generator import generate_pdf
+import time
+from config import TRACE_PANEL, JOB_POLL_S, SPECULATE, SPECULATE_DEBOUNCE_S, SPECULATE_MAX
+from utils.jobs import get_jobs, PRIORITY_SPECULATIVE
+from utils.tracing import METRICS
 from urllib.parse import quote_plus
-import streamlit.components.v1 as components
+
+# ReportLab and the components API are imported where they are first used,
+# and the planner (Gemini client, NumPy) only in the job workers, so a cold
+# boot renders the form without loading them
 
 st.set_page_config(page_title="ATLAS - Agentic Travel Planner", page_icon="✈️", layout="wide")
 
@@ -16,26 +21,56 @@ def format_inr(value):
     except:
         return str(value)
 
+def show_fragment(kind, entry):
+    # Live preview of a day / hotel from a plan still being generated
+    if kind == "hotel":
+        with st.expander(f"🏙️ {entry.get('city', 'City')} — {entry.get('hotel', 'Hotel')}"):
+            st.write(f"**Type:** {entry.get('type', 'Stay Type')}")
+            st.write(f"**Estimated Cost:** {format_inr(entry.get('estimated_cost', 0))}")
+    else:
+        label = f"🗓️ Day {entry.get('day')}: {entry.get('title')}"
+        if entry.get("city"):
+            label += f" — 🏙️ {entry['city']}"
+        with st.expander(label):
+            for act in entry.get("activities", []):
+                st.markdown(f"- {act}")
+
+def sidebar_payload():
+    # The trip the sidebar describes right now (read from widget state, so
+    # it is current inside fragments too), or None while it is incomplete
+    state = st.session_state
+    destinations = [d.strip() for d in state.get("destinations_raw", "").split(",") if d.strip()]
+    if not state.get("source") or not destinations or "aligrh" in destinations:
+        return None
+    return {
+        "source": state["source"],
+        "destinations": destinations,
+        "duration": state["duration"],
+        "budget": state["budget"],
+        "travelers": state["travelers"]
+    }
+
 # Sidebar Input
 with st.sidebar:
     st.header("✏️ Trip Details")
 
-    source = st.text_input("Starting City", placeholder="e.g. Delhi")
+    source = st.text_input("Starting City", placeholder="e.g. Delhi", key="source")
 
     destinations_raw = st.text_input(
         "Destination(s)",
-        placeholder="e.g. Goa, Kochi, Munnar"
+        placeholder="e.g. Goa, Kochi, Munnar",
+        key="destinations_raw"
     )
     destinations = [d.strip() for d in destinations_raw.split(",") if d.strip()]
 
-    duration = st.number_input("Trip Duration (days)", min_value=1, step=1)
-    budget = st.number_input("Total Budget (INR)", min_value=2000, step=1000)
-    travelers = st.number_input("Number of Travelers", min_value=1, step=1)
+    duration = st.number_input("Trip Duration (days)", min_value=1, step=1, key="duration")
+    budget = st.number_input("Total Budget (INR)", min_value=2000, step=1000, key="budget")
+    travelers = st.number_input("Number of Travelers", min_value=1, step=1, key="travelers")
 
     generate = st.button("Generate Itinerary")
 
 # -------------------------------
-# MAIN LOGIC (spinner only here)
+# MAIN LOGIC (queues a planning job)
 # -------------------------------
 if generate:
     if not source:
@@ -48,19 +83,150 @@ if generate:
         st.markdown("## **I don't know bruh ask DJ** 🥀💔😢 \ndont kirk me")
         st.stop()
 
-    with st.spinner("🧠 Building your trip with our agents..."):
-        try:
-            result = generate_plan({
-                "source": source,
-                "destinations": destinations,
-                "duration": duration,
-                "budget": budget,
-                "travelers": travelers
-            })
-            st.session_state["result"] = result
+    payload = {
+        "source": source,
+        "destinations": destinations,
+        "duration": duration,
+        "budget": budget,
+        "travelers": travelers
+    }
+
+    # Planning runs on the background job queue; the session only keeps the
+    # job ID (also put in the URL, so a reload or reconnect reattaches).
+    # Generating the same trip again keeps polling a job still in flight and
+    # retries a crashed one, which resumes from its last completed step.
+    # A speculative job for this exact trip is attached to even if done.
+    jobs = get_jobs()
+    job_id = st.session_state.get("job_id")
+    attach = ("queued", "running")
+    speculation = st.session_state.pop("speculation", None)
+    if speculation and speculation["payload"] == payload:
+        job_id = speculation["job_id"]
+        attach += ("done",)
+        jobs.promote(job_id)
+        METRICS.inc("atlas_speculations_total", {"result": "used"})
+    elif speculation:
+        jobs.cancel(speculation["job_id"])
+        METRICS.inc("atlas_speculations_total", {"result": "stale"})
+    job = jobs.get(job_id) if job_id else None
+    if not (job and job["payload"] == payload
+            and (job["status"] in attach or jobs.retry(job_id))):
+        job_id = jobs.submit(payload)
+    st.session_state["job_id"] = job_id
+    st.session_state["payload"] = payload
+    st.query_params["job"] = job_id
+    st.session_state.pop("result", None)
+    st.session_state.pop("trace", None)
+
+if "job_id" not in st.session_state and st.query_params.get("job"):
+    st.session_state["job_id"] = st.query_params["job"]
+
+# -------------------------------
+# SPECULATIVE PREFETCH (ATLAS_SPECULATE=1)
+# -------------------------------
+@st.fragment(run_every=SPECULATE_DEBOUNCE_S / 2)
+def speculate():
+    # Users look the form over for a few seconds before clicking Generate:
+    # once the inputs pass pre-flight and have been stable for the debounce
+    # window, plan them on a low-priority job that Generate can attach to.
+    state = st.session_state
+    jobs = get_jobs()
+    payload = sidebar_payload()
+    now = time.time()
+
+    seen = state.get("speculation_seen")
+    if seen is None or seen["payload"] != payload:
+        state["speculation_seen"] = seen = {"payload": payload, "since": now}
+
+    speculation = state.get("speculation")
+    if speculation and speculation["payload"] != payload:
+        # Inputs were edited: the stale run stops at its next stage
+        jobs.cancel(speculation["job_id"])
+        METRICS.inc("atlas_speculations_total", {"result": "stale"})
+        speculation = state["speculation"] = None
+
+    if (speculation is None and payload is not None
+            and payload != state.get("payload")  # already generated
+            and now - seen["since"] >= SPECULATE_DEBOUNCE_S
+            and state.get("speculations", 0) < SPECULATE_MAX
+            and seen.get("preflight") is not False):
+        from agents.validation_agent import validate_request
+
+        seen["preflight"], _ = validate_request(payload)
+        if seen["preflight"]:
+            job_id = jobs.submit(payload, priority=PRIORITY_SPECULATIVE)
+            speculation = state["speculation"] = {"payload": payload, "job_id": job_id}
+            state["speculations"] = state.get("speculations", 0) + 1
+            METRICS.inc("atlas_speculations_total", {"result": "started"})
+
+    if speculation:
+        st.caption("⚡ Planning ahead while you review your trip...")
+
+if SPECULATE:
+    with st.sidebar:
+        speculate()
+
+# -------------------------------
+# JOB PROGRESS (polled until the plan is ready)
+# -------------------------------
+@st.fragment(run_every=JOB_POLL_S)
+def job_progress(job_id):
+    job = get_jobs().get(job_id)
+    if job is None:
+        # Pruned, or a link from another instance
+        st.session_state.pop("job_id", None)
+        st.query_params.pop("job", None)
+        st.rerun()
+
+    st.session_state["payload"] = job["payload"]
+    if job["status"] == "done":
+        st.session_state["result"] = job["result"]
+        st.session_state["trace"] = job["trace"]
+        st.rerun()
+    if job["status"] == "failed":
+        st.session_state["result"] = {
+            "error": "pipeline_crash",
+            "reasons": [job["error"], "Click *Generate Itinerary* again to resume from the last completed step."],
+        }
+        st.rerun()
+    if job["status"] == "cancelled":
+        st.session_state["result"] = {
+            "error": "cancelled",
+            "reasons": ["Planning was cancelled before the plan was ready.",
+                        "Click *Generate Itinerary* again to resume from the last completed step."],
+        }
+        st.rerun()
+
+    progress = job["progress"] or {}
+    if job["status"] == "queued":
+        st.info("⏳ Waiting for a free planner...")
+    else:
+        stage = progress.get("stage") or "Starting"
+        loop = progress.get("loop")
+        st.info(f"🧠 Building your trip with our agents... **{stage}**"
+                + (f" (attempt {loop + 1})" if loop else ""))
+
+    # Days / hotels of the first draft, as they stream in
+    for kind, entry in progress.get("fragments", []):
+        show_fragment(kind, entry)
 
-        except Exception as e:
-            st.session_state["result"] = {"error": "pipeline_crash", "reasons": [str(e)]}
+if st.session_state.get("job_id") and "result" not in st.session_state:
+    job_progress(st.session_state["job_id"])
+    st.stop()
+
+# -------------------------------
+# OPTIONAL: last run trace (ATLAS_TRACE_PANEL=1)
+# -------------------------------
+if TRACE_PANEL and st.session_state.get("trace"):
+    trace = st.session_state["trace"]
+    with st.sidebar.expander("🔍 Last run trace"):
+        attrs = trace.get("attrs", {})
+        st.write(f"**Total:** {trace.get('duration_ms')} ms · **Loops:** {attrs.get('loops', '-')}")
+        st.write(f"**LLM calls:** {attrs.get('llm_calls', 0)} · "
+                 f"**Tokens:** {attrs.get('prompt_tokens', 0)} in / {attrs.get('response_tokens', 0)} out")
+        for sp in trace.get("spans", []):
+            st.write(f"- `{sp['name']}` {sp['duration_ms']} ms")
+        st.json(trace, expanded=False)
 
 # -------------------------------
 # POST-SPINNER: UI + Validation
@@ -84,6 +250,13 @@ if result.get("error"):
 itinerary = result
 st.session_state["itinerary"] = itinerary
 
+# Render for the trip that was planned; the sidebar may have been edited
+# (or be empty after a reconnect) since the job was submitted
+planned = st.session_state.get("payload")
+if planned:
+    source, destinations = planned["source"], planned["destinations"]
+    duration, budget, travelers = planned["duration"], planned["budget"], planned["travelers"]
+
 # -------------------------------
 # ITINERARY DISPLAY
 # -------------------------------
@@ -105,6 +278,8 @@ st.markdown("---")
 # -------------------------------
 if "city_accommodations" in itinerary:
 
+    import streamlit.components.v1 as components
+
     st.markdown("## 🏠 Accommodation (Per City)")
     hotels = itinerary["city_accommodations"]
 
@@ -179,9 +354,10 @@ st.markdown("---")
 # -------------------------------
 st.markdown("## 📄 Download Your Itinerary")
 if st.button("⬇️ Generate PDF"):
-    pdf_file = generate_pdf(itinerary)
-    with open(pdf_file, "rb") as f:
-        st.download_button("📄 Click to Download PDF", f, "ATLAS_Itinerary.pdf", "application/pdf")
+    from utils.pdf_generator import generate_pdf
+
+    pdf_bytes = generate_pdf(itinerary)
+    st.download_button("📄 Click to Download PDF", pdf_bytes, "ATLAS_Itinerary.pdf", "application/pdf")
 
 st.markdown("---")
 
@@ -0,0 +1,213 @@
+"""
+Batch planner: plan many trips from a JSONL file concurrently.
+
+    python src/batch_runner.py trips.jsonl plans.jsonl --concurrency 8 --resume
+
+Each input line is one generate_plan payload (source, destinations, duration,
+budget, travelers) plus an optional "id". Each output line is written as soon
+as that trip finishes:
+
+    {"id": ..., "ok": true,  "latency_s": 3.2, "plan": {...}}
+    {"id": ..., "ok": false, "latency_s": 0.0, "error": {...}}
+
+With --resume, ids already present in the output file are skipped and new
+results are appended. With --store, successful plans are also appended to
+the Parquet trip library (utils.trip_store) in batches of STORE_BATCH.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from planner_core import generate_plan
+from utils.tracing import METRICS
+
+# Plans written to the trip library per Parquet part
+STORE_BATCH = 1000
+
+
+def read_payloads(path):
+    """
+    Yield (id, payload) for each non-empty line; ids default to "line-<n>".
+    Unparseable lines are yielded with payload None.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for n, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                payload = json.loads(line)
+            except ValueError:
+                payload = None
+            if not isinstance(payload, dict):
+                yield f"line-{n}", None
+                continue
+            yield str(payload.get("id", f"line-{n}")), payload
+
+
+def completed_ids(path):
+    """
+    Ids already written to an output file (a torn last line is ignored).
+    """
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                done.add(str(json.loads(line)["id"]))
+            except (ValueError, KeyError, TypeError):
+                continue
+    return done
+
+
+def run_one(trip_id, payload):
+    start = time.perf_counter()
+    if payload is None:
+        result = {"error": "invalid_payload", "reasons": ["Input line is not valid JSON."]}
+    else:
+        try:
+            result = generate_plan(payload)
+        except Exception as e:
+            result = {"error": "pipeline_crash", "reasons": [str(e)]}
+    latency = time.perf_counter() - start
+
+    record = {"id": trip_id, "ok": "error" not in result, "latency_s": round(latency, 4)}
+    record["plan" if record["ok"] else "error"] = result
+    return record
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def run_batch(input_path, output_path, concurrency=4, resume=False, store=None):
+    """
+    Run every payload in `input_path` through the planner with at most
+    `concurrency` trips in flight, streaming records to `output_path`
+    (and successful plans to the TripStore `store`, if given).
+    Returns a summary dict.
+    """
+    skip = completed_ids(output_path) if resume else set()
+    mode = "a" if resume else "w"
+
+    # Make sure appended records start on a fresh line
+    if resume and os.path.exists(output_path) and os.path.getsize(output_path):
+        with open(output_path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            torn = f.read(1) != b"\n"
+        if torn:
+            with open(output_path, "a", encoding="utf-8") as f:
+                f.write("\n")
+
+    latencies = []
+    ok = failed = skipped = stored = 0
+    payloads = {}
+    to_store = []
+
+    def flush_store():
+        nonlocal stored, to_store
+        if to_store:
+            stored += len(store.append(to_store))
+            to_store = []
+    start = time.perf_counter()
+
+    with open(output_path, mode, encoding="utf-8") as out, \
+            ThreadPoolExecutor(max_workers=concurrency) as pool:
+
+        pending = set()
+
+        def drain(block_until):
+            nonlocal ok, failed, pending
+            while len(pending) > block_until:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    record = future.result()
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    out.flush()
+                    latencies.append(record["latency_s"])
+                    if record["ok"]:
+                        ok += 1
+                    else:
+                        failed += 1
+                    if store is not None:
+                        payload = payloads.pop(record["id"], None)
+                        if record["ok"]:
+                            to_store.append((payload, record["plan"]))
+                            if len(to_store) >= STORE_BATCH:
+                                flush_store()
+
+        for trip_id, payload in read_payloads(input_path):
+            if trip_id in skip:
+                skipped += 1
+                continue
+            if store is not None and payload is not None:
+                payloads[trip_id] = payload
+            pending.add(pool.submit(run_one, trip_id, payload))
+            # Keep a bounded window so huge inputs are never fully queued
+            drain(block_until=concurrency * 2)
+
+        drain(block_until=0)
+        if store is not None:
+            flush_store()
+
+    elapsed = time.perf_counter() - start
+    done = ok + failed
+    return {
+        "planned": done,
+        "ok": ok,
+        "failed": failed,
+        "skipped": skipped,
+        "stored": stored,
+        "wall_s": round(elapsed, 3),
+        "throughput_per_s": round(done / elapsed, 3) if elapsed > 0 else 0.0,
+        "latency_p50_s": percentile(latencies, 0.50),
+        "latency_p95_s": percentile(latencies, 0.95),
+        "latency_p99_s": percentile(latencies, 0.99),
+        "latency_max_s": max(latencies, default=0.0),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Plan trips from a JSONL file.")
+    parser.add_argument("input", help="JSONL file with one payload per line")
+    parser.add_argument("output", help="JSONL file to write results to")
+    parser.add_argument("-j", "--concurrency", type=int, default=4)
+    parser.add_argument("--resume", action="store_true", help="skip ids already in the output file")
+    parser.add_argument("--metrics", help="write aggregated metrics here (.json, else Prometheus text)")
+    parser.add_argument("--store", action="store_true", help="also save successful plans to the trip library")
+    args = parser.parse_args(argv)
+
+    store = None
+    if args.store:
+        from utils.trip_store import get_trip_store
+        store = get_trip_store()
+
+    summary = run_batch(args.input, args.output, args.concurrency, args.resume, store)
+
+    if args.metrics:
+        with open(args.metrics, "w", encoding="utf-8") as f:
+            if args.metrics.endswith(".json"):
+                json.dump(METRICS.export_json(), f, indent=2)
+            else:
+                f.write(METRICS.export_prometheus())
+
+    print(
+        f"Planned {summary['planned']} trip(s) ({summary['ok']} ok, {summary['failed']} failed, "
+        f"{summary['skipped']} skipped) in {summary['wall_s']}s — "
+        f"{summary['throughput_per_s']} trips/s; latency p50 {summary['latency_p50_s']}s, "
+        f"p95 {summary['latency_p95_s']}s, p99 {summary['latency_p99_s']}s, "
+        f"max {summary['latency_max_s']}s",
+        file=sys.stderr,
+    )
+    return 0 if summary["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
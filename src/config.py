@@ -1,19 +1,109 @@
 import os
 from dotenv import load_dotenv
-import google.generativeai as genai
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Fetch Gemini API key
+# Fetch Gemini API key (only required when the Gemini backend is used)
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
-if not GEMINI_API_KEY:
-    raise ValueError("⚠️ GEMINI_API_KEY not found in .env file")
 
-genai.configure(api_key=GEMINI_API_KEY)
+def require_api_key():
+    if not GEMINI_API_KEY:
+        raise ValueError("⚠️ GEMINI_API_KEY not found in .env file")
+    return GEMINI_API_KEY
+
 
 # Example config values
 PROJECT_NAME = "Agentic Travel Planner"
 VERSION = "0.1"
-DEFAULT_MODEL = "gemini-flash-latest"
+DEFAULT_MODEL = os.getenv("GEMINI_MODEL", "gemini-flash-latest")
+
+# LLM backend: "gemini" (live API) or "local" (offline deterministic stand-in)
+LLM_BACKEND = os.getenv("ATLAS_LLM_BACKEND", "gemini")
+
+# LLM response cache (memory LRU + disk tier)
+LLM_CACHE_ENABLED = os.getenv("ATLAS_LLM_CACHE", "1") != "0"
+LLM_CACHE_DIR = os.getenv("ATLAS_LLM_CACHE_DIR", ".atlas_cache/llm")
+LLM_CACHE_TTL = int(os.getenv("ATLAS_LLM_CACHE_TTL", 24 * 3600))
+LLM_CACHE_MAX_BYTES = int(os.getenv("ATLAS_LLM_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+LLM_CACHE_MEMORY_ITEMS = int(os.getenv("ATLAS_LLM_CACHE_MEMORY_ITEMS", 256))
+
+# Multi-city fan-out: trips with at least this many destinations generate
+# each city concurrently (0 disables)
+FANOUT_MIN_CITIES = int(os.getenv("ATLAS_FANOUT_MIN_CITIES", 3))
+FANOUT_MAX_WORKERS = int(os.getenv("ATLAS_FANOUT_MAX_WORKERS", 8))
+
+# Gemini call policy: client-side rate limit, per-call deadline, retries, hedging
+LLM_RATE_PER_MIN = float(os.getenv("ATLAS_LLM_RATE_PER_MIN", 60))
+LLM_BURST = int(os.getenv("ATLAS_LLM_BURST", 5))
+LLM_TIMEOUT_S = float(os.getenv("ATLAS_LLM_TIMEOUT_S", 60))
+LLM_MAX_RETRIES = int(os.getenv("ATLAS_LLM_MAX_RETRIES", 3))
+LLM_BACKOFF_BASE_S = float(os.getenv("ATLAS_LLM_BACKOFF_BASE_S", 1))
+LLM_BACKOFF_MAX_S = float(os.getenv("ATLAS_LLM_BACKOFF_MAX_S", 20))
+LLM_HEDGE = os.getenv("ATLAS_LLM_HEDGE", "0") == "1"
+LLM_HEDGE_AFTER_S = float(os.getenv("ATLAS_LLM_HEDGE_AFTER_S", 8))
+
+# Show the last request's trace in the Streamlit sidebar
+TRACE_PANEL = os.getenv("ATLAS_TRACE_PANEL", "0") == "1"
+
+# Packaged city/country gazetteer used for trip-region inference
+GAZETTEER_PATH = os.getenv(
+    "ATLAS_GAZETTEER", os.path.join(os.path.dirname(__file__), "data", "gazetteer.csv")
+)
+
+# Gemini JSON response mode: plan calls send a response schema instead of
+# spelling out the JSON skeleton in every prompt
+LLM_JSON_MODE = os.getenv("ATLAS_LLM_JSON_MODE", "1") != "0"
+
+# Per-city fragment store: validated day plans + hotel per (city, days,
+# budget tier, traveler band), reused to compose multi-city trips
+FRAGMENT_CACHE_ENABLED = os.getenv("ATLAS_FRAGMENT_CACHE", "1") != "0"
+FRAGMENT_CACHE_DIR = os.getenv("ATLAS_FRAGMENT_CACHE_DIR", ".atlas_cache/fragments")
+FRAGMENT_CACHE_TTL = int(os.getenv("ATLAS_FRAGMENT_CACHE_TTL", 7 * 24 * 3600))
+FRAGMENT_CACHE_MAX_BYTES = int(os.getenv("ATLAS_FRAGMENT_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+# Pipeline run checkpoints (SQLite): completed graph nodes are saved per run
+# ID so an interrupted or failed run resumes from the last finished node
+CHECKPOINT_DB = os.getenv("ATLAS_CHECKPOINT_DB", ".atlas_cache/runs.sqlite")
+CHECKPOINT_TTL = int(os.getenv("ATLAS_CHECKPOINT_TTL", 3 * 24 * 3600))
+
+# Headless planning service (src/server.py): worker threads running the
+# pipeline, and how many requests may wait for one before new ones get a 429
+SERVER_PORT = int(os.getenv("ATLAS_SERVER_PORT", 8080))
+SERVER_WORKERS = int(os.getenv("ATLAS_SERVER_WORKERS", 4))
+SERVER_QUEUE_SIZE = int(os.getenv("ATLAS_SERVER_QUEUE_SIZE", 16))
+
+# Background planning jobs (SQLite queue + worker threads): the app submits
+# a job and polls it, so a rerun or reconnect never abandons a paid-for run.
+# A running job not heard from within the lease is requeued (and resumes
+# from its checkpoints).
+JOB_DB = os.getenv("ATLAS_JOB_DB", ".atlas_cache/jobs.sqlite")
+JOB_WORKERS = int(os.getenv("ATLAS_JOB_WORKERS", 2))
+JOB_LEASE_S = float(os.getenv("ATLAS_JOB_LEASE_S", 60))
+JOB_TTL = int(os.getenv("ATLAS_JOB_TTL", 3 * 24 * 3600))
+JOB_POLL_S = float(os.getenv("ATLAS_JOB_POLL_S", 1.0))
+
+# Model cascade: comma-separated models, cheapest / fastest first (defaults
+# to DEFAULT_MODEL alone). Trips of up to CASCADE_SMALL_DAYS days in one city
+# start on the first tier, larger ones on the second; each loop that failed
+# validation escalates a tier. Tiers failing more often than the max rate
+# (after min samples) or slower than the next tier are skipped.
+MODEL_TIERS = [m.strip() for m in os.getenv("ATLAS_MODEL_TIERS", DEFAULT_MODEL).split(",") if m.strip()]
+CASCADE_SMALL_DAYS = int(os.getenv("ATLAS_CASCADE_SMALL_DAYS", 3))
+CASCADE_MAX_FAILURE_RATE = float(os.getenv("ATLAS_CASCADE_MAX_FAILURE_RATE", 0.5))
+CASCADE_MIN_SAMPLES = int(os.getenv("ATLAS_CASCADE_MIN_SAMPLES", 5))
+
+# Trip library: append-only Parquet store of accepted plans (CLI saves,
+# batch_runner --store), indexed for "serve a stored plan that fits"
+# lookups. With serving on, generate_plan answers from it when it can.
+TRIP_STORE_DIR = os.getenv("ATLAS_TRIP_STORE_DIR", "atlas_trips")
+TRIP_STORE_SERVE = os.getenv("ATLAS_TRIP_STORE_SERVE", "0") == "1"
+
+# Speculative planning (opt-in): once the sidebar inputs pass pre-flight and
+# have not changed for the debounce window, the app queues a low-priority
+# job for them, which Generate then attaches to. A speculation whose inputs
+# were edited is cancelled; each session may start at most SPECULATE_MAX.
+SPECULATE = os.getenv("ATLAS_SPECULATE", "0") == "1"
+SPECULATE_DEBOUNCE_S = float(os.getenv("ATLAS_SPECULATE_DEBOUNCE_S", 2.0))
+SPECULATE_MAX = int(os.getenv("ATLAS_SPECULATE_MAX", 5))
@@ -0,0 +1,322 @@
+"""
+Typed view of a generated plan.
+
+The pipeline still hands plain dicts to the UI, PDF renderer and fragment
+splicing; inside a loop the plan is parsed once into an Itinerary so the
+budget and validation stages share one traversal:
+
+    model = Itinerary.from_dict(plan)   # structure checks + cost totals
+    model.set_costs(new_costs)          # over model.cost_entries(); totals refreshed
+    model.total, model.issues           # issues are Issue(code, severity, path, message)
+    plan = model.to_dict()              # unknown keys are carried through
+"""
+from collections import namedtuple
+from dataclasses import dataclass, field
+
+
+class Issue(namedtuple("Issue", "code severity path message")):
+    """
+    One validation finding. `severity` is "error" (the plan fails
+    validation) or "warning"; `path` locates it in the plan dict, e.g.
+    "per_day_breakdown[2].city". str() gives the human-readable message.
+    """
+
+    __slots__ = ()
+
+    def __str__(self):
+        return self.message
+
+
+def _valid(cost):
+    return isinstance(cost, (int, float)) and not isinstance(cost, bool) and cost >= 0
+
+
+def _extra(data, known):
+    return {k: v for k, v in data.items() if k not in known}
+
+
+@dataclass(slots=True)
+class Day:
+    day: object = None
+    city: str = None
+    title: str = None
+    activities: list = None
+    estimated_cost: object = 0
+    extra: dict = field(default_factory=dict)
+
+    FIELDS = ("day", "city", "title", "activities", "estimated_cost")
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get("day"), data.get("city"), data.get("title"), data.get("activities"),
+                   data.get("estimated_cost", 0), _extra(data, cls.FIELDS))
+
+    def to_dict(self):
+        out = {"day": self.day}
+        if self.city is not None:
+            out["city"] = self.city
+        if self.title is not None:
+            out["title"] = self.title
+        if self.activities is not None:
+            out["activities"] = self.activities
+        out["estimated_cost"] = self.estimated_cost
+        out.update(self.extra)
+        return out
+
+
+@dataclass(slots=True)
+class Stay:
+    city: str = None
+    hotel: object = None
+    estimated_cost: object = 0
+    extra: dict = field(default_factory=dict)
+
+    FIELDS = ("city", "hotel", "estimated_cost")
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get("city"), data.get("hotel"), data.get("estimated_cost", 0),
+                   _extra(data, cls.FIELDS))
+
+    def to_dict(self):
+        out = {}
+        if self.city is not None:
+            out["city"] = self.city
+        if self.hotel is not None:
+            out["hotel"] = self.hotel
+        out["estimated_cost"] = self.estimated_cost
+        out.update(self.extra)
+        return out
+
+
+@dataclass(slots=True)
+class Transport:
+    recommended_transport: object = None
+    estimated_cost: object = 0
+    extra: dict = field(default_factory=dict)
+
+    FIELDS = ("recommended_transport", "estimated_cost")
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get("recommended_transport"), data.get("estimated_cost", 0),
+                   _extra(data, cls.FIELDS))
+
+    def to_dict(self):
+        out = {}
+        if self.recommended_transport is not None:
+            out["recommended_transport"] = self.recommended_transport
+        out["estimated_cost"] = self.estimated_cost
+        out.update(self.extra)
+        return out
+
+
+@dataclass(slots=True)
+class Itinerary:
+    """
+    days / stays (city_accommodations) / accommodation / transport, plus
+    every other top-level key in `extra`. The general accommodation block
+    is always kept, but its cost only counts in plans without city stays.
+
+    `issues` holds the structural Issues found while parsing (validate_plan
+    adds the checks that need the user's request). Cost totals are kept per
+    section; the budget solver reads cost_entries() and writes back with
+    set_costs, which refreshes them. Costs that are missing, non-numeric or
+    negative count as 0 and are left out of cost_entries().
+    """
+    days: list = field(default_factory=list)
+    stays: list = None
+    accommodation: Stay = None
+    transport: Transport = None
+    extra: dict = field(default_factory=dict)
+    issues: list = field(default_factory=list)
+    day_total: float = 0
+    stay_total: float = 0
+    transport_cost: float = 0
+
+    FIELDS = ("per_day_breakdown", "city_accommodations", "accommodation", "transport")
+
+    @classmethod
+    def from_dict(cls, plan):
+        """
+        Parse a plan dict in one pass, collecting issues and totals.
+        Malformed entries (non-dict days/stays) are dropped.
+        """
+        model = cls(extra=_extra(plan, cls.FIELDS))
+        issues = model.issues
+
+        # ---- Accommodation ----
+        if "city_accommodations" in plan:
+            raw = plan["city_accommodations"]
+            model.stays = [Stay.from_dict(ac) for ac in raw if isinstance(ac, dict)] \
+                if isinstance(raw, list) else []
+        if isinstance(plan.get("accommodation"), dict):
+            # Always kept; it only counts towards costs without city stays
+            model.accommodation = Stay.from_dict(plan["accommodation"])
+        model.stay_total = sum(s.estimated_cost for s in model.stay_entries() if _valid(s.estimated_cost))
+        if not plan.get("city_accommodations"):
+            issues.append(Issue("missing_accommodation", "error", "city_accommodations",
+                                "Missing per-city accommodation details."))
+        seen = set()
+        for i, stay in enumerate(model.stays or []):
+            path = f"city_accommodations[{i}]"
+            city = stay.city.lower() if isinstance(stay.city, str) else None
+            if city and city in seen:
+                issues.append(Issue("duplicate_stay", "warning", path, f"More than one stay listed for {stay.city}."))
+            seen.add(city)
+            if not _valid(stay.estimated_cost):
+                issues.append(Issue("invalid_cost", "warning", f"{path}.estimated_cost",
+                                    f"Stay in {stay.city or '?'} has invalid estimated cost."))
+
+        # ---- Days ----
+        per_day = plan.get("per_day_breakdown", [])
+        if not isinstance(per_day, list):
+            issues.append(Issue("invalid_per_day_breakdown", "error", "per_day_breakdown",
+                                "Invalid per-day breakdown structure."))
+        else:
+            total = 0
+            for n, raw_day in enumerate(per_day):
+                if not isinstance(raw_day, dict):
+                    issues.append(Issue("invalid_per_day_breakdown", "error", f"per_day_breakdown[{n}]",
+                                        "Invalid per-day breakdown structure."))
+                    continue
+                day = Day.from_dict(raw_day)
+                path = f"per_day_breakdown[{len(model.days)}]"
+                model.days.append(day)
+                label = day.day if day.day is not None else "?"
+                if day.day != len(model.days) or isinstance(day.day, bool):
+                    issues.append(Issue("day_numbering", "warning", f"{path}.day",
+                                        f"Day {label} is out of sequence (expected day {len(model.days)})."))
+                if not day.activities:
+                    issues.append(Issue("day_no_activities", "error", f"{path}.activities",
+                                        f"Day {label} has no activities listed."))
+                if _valid(day.estimated_cost):
+                    total += day.estimated_cost
+                else:
+                    issues.append(Issue("invalid_day_cost", "error", f"{path}.estimated_cost",
+                                        f"Day {label} has invalid estimated cost."))
+            model.day_total = total
+
+        # ---- Transport ----
+        if isinstance(plan.get("transport"), dict):
+            model.transport = Transport.from_dict(plan["transport"])
+            if _valid(model.transport.estimated_cost):
+                model.transport_cost = model.transport.estimated_cost
+            else:
+                issues.append(Issue("invalid_cost", "warning", "transport.estimated_cost",
+                                    "Transport has invalid estimated cost."))
+
+        return model
+
+    def to_dict(self):
+        out = dict(self.extra)
+        out["per_day_breakdown"] = [d.to_dict() for d in self.days]
+        if self.stays is not None:
+            out["city_accommodations"] = [s.to_dict() for s in self.stays]
+        if self.accommodation is not None:
+            out["accommodation"] = self.accommodation.to_dict()
+        if self.transport is not None:
+            out["transport"] = self.transport.to_dict()
+        return out
+
+    # ---- Costs ----
+    @property
+    def total(self):
+        return self.day_total + self.stay_total + self.transport_cost
+
+    def stay_entries(self):
+        if self.stays is not None:
+            return self.stays
+        return [self.accommodation] if self.accommodation is not None else []
+
+    def cost_entries(self):
+        """
+        Entries carrying a valid cost, in a fixed order: days, stays (or the
+        single accommodation), transport. Pairs with set_costs.
+        """
+        tail = [self.transport] if self.transport is not None else []
+        return [e for e in self.days + self.stay_entries() + tail if _valid(e.estimated_cost)]
+
+    def set_costs(self, costs):
+        """
+        Write new costs onto cost_entries() (same order) and refresh totals.
+        """
+        for entry, cost in zip(self.cost_entries(), costs):
+            entry.estimated_cost = int(cost)
+        self.day_total = sum(d.estimated_cost for d in self.days if _valid(d.estimated_cost))
+        self.stay_total = sum(s.estimated_cost for s in self.stay_entries() if _valid(s.estimated_cost))
+        if self.transport is not None and _valid(self.transport.estimated_cost):
+            self.transport_cost = self.transport.estimated_cost
+        return self
+
+
+# ---- Response schema ----
+# The one definition of the plan's shape. Gemini response schemas (JSON mode)
+# and the example skeleton used when JSON mode is off are both derived from it.
+
+def _obj(properties):
+    return {"type": "object", "properties": properties, "required": list(properties)}
+
+
+def _str(description=None):
+    return {"type": "string", "description": description} if description else {"type": "string"}
+
+
+_INT = {"type": "integer"}
+_COST = {"type": "integer", "description": "INR"}
+
+PLAN_SCHEMA = _obj({
+    "destination": _str("Source → destinations"),
+    "duration": _INT,
+    "total_budget": _INT,
+    "travelers": _INT,
+    "per_day_breakdown": {"type": "array", "items": _obj({
+        "day": _INT,
+        "city": _str("City name"),
+        "title": _str("Short title for the day"),
+        "activities": {"type": "array", "items": _str("Activity")},
+        "estimated_cost": _COST,
+    })},
+    "city_accommodations": {"type": "array", "items": _obj({
+        "city": _str("City name"),
+        "hotel": _str("ONE hotel name, not a chain of hotels"),
+        "type": _str("Hotel/Hostel category"),
+        "estimated_cost": _COST,
+    })},
+    "accommodation": _obj({
+        "type": _str("General accommodation category"),
+        "example": _str("Overall example stay"),
+        "estimated_cost": _COST,
+    }),
+    "transport": _obj({
+        "recommended_transport": _str("Recommended transport"),
+        "estimated_cost": _COST,
+    }),
+    "top_places": {"type": "array", "items": _str("Place")},
+    "summary": _str("Short summary paragraph"),
+})
+
+
+def response_schema(keys=None):
+    """
+    PLAN_SCHEMA, optionally restricted to some top-level keys
+    (fragment, glue and repair calls ask for parts of a plan).
+    """
+    if keys is None:
+        return PLAN_SCHEMA
+    return _obj({k: PLAN_SCHEMA["properties"][k] for k in keys})
+
+
+def schema_skeleton(schema):
+    """
+    Example instance of a schema, with descriptions as placeholder text:
+    the JSON skeleton spelled out in prompts when JSON mode is off.
+    """
+    kind = schema["type"]
+    if kind == "object":
+        return {k: schema_skeleton(v) for k, v in schema["properties"].items()}
+    if kind == "array":
+        return [schema_skeleton(schema["items"])]
+    if kind == "integer":
+        return 0
+    return schema.get("description", "")
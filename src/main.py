@@ -1,6 +1,6 @@
 print("=== ATLAS ===")
 
-from src.ui.cli_interface import launch_cli
+from ui.cli_interface import launch_cli
 
 if __name__ == "__main__":
     launch_cli()
@@ -1,17 +1,55 @@
-from agents.itinerary_agent import generate_itinerary
-from agents.budget_agent import optimize_budget, calculate_total
-from agents.validation_agent import validate
-from agents.feedback_agent import refine_state
+from agents.itinerary_agent import (
+    allocate_days,
+    cached_cities,
+    compose_itinerary,
+    emit_city,
+    first_days,
+    generate_itinerary,
+    generate_itinerary_parallel,
+    generate_trip_glue,
+    harvest_fragments,
+    plan_city,
+    regenerate_fragments,
+)
+from agents.budget_agent import optimize_budget
+from agents.validation_agent import validate_plan, locate_failures
+from agents.feedback_agent import refine_state, repairable
+from config import FANOUT_MIN_CITIES, FANOUT_MAX_WORKERS
+from itinerary import Itinerary
+from utils.graph import GraphRunner, Node
+from utils.model_router import get_router, use_model
+from utils.tracing import METRICS, current_trace, span
 
-def run_agentic_pipeline(source, destinations, duration, budget, travelers, max_loops=2):
+def run_agentic_pipeline(source, destinations, duration, budget, travelers, max_loops=2,
+                         on_fragment=None, run_id=None, store=None):
     """
     Agentic pipeline for ATLAS (multi-step reasoning workflow).
 
     Flow:
     1) ItineraryAgent  → Base plan
     2) BudgetAgent     → Soft cost optimization
-    3) ValidationAgent → Structural & feasibility checks
+    3) ValidationAgent → Structural plan checks
     4) FeedbackAgent   → Auto refinements (if needed)
+
+    Input-only feasibility checks are expected to have run already
+    (validation_agent.validate_request, called by planner_core).
+
+    `on_fragment(kind, entry)` receives ("day", ...) / ("hotel", ...) entries
+    of the first draft as they stream in; validation still runs on the final
+    assembled plan.
+
+    Refinement loops regenerate only the failed days / hotels / transport
+    and splice them into the current plan; a full regeneration happens only
+    when the plan is too broken to patch.
+
+    Each loop's drafting calls go to the model tier picked by the model
+    router (small trips start on the cheapest tier, failed loops escalate);
+    the tier that produced the accepted plan is recorded on the trace.
+
+    Each stage runs as a graph of nodes (route → tier → city/glue → draft → review)
+    on a GraphRunner. With a `run_id` and checkpoint `store`, every finished
+    node is saved, and calling again with the same run_id skips the nodes
+    that already completed.
     """
 
     user_input = {
@@ -23,31 +61,180 @@ def run_agentic_pipeline(source, destinations, duration, budget, travelers, max_
     }
 
     state = {"user": user_input, "plan": {}}
+    targets = None
+    errors = []
+
+    allocation = allocate_days(destinations or ["Unknown City"], duration)
+    offsets = first_days(allocation)
+
+    def on_node(name, output):
+        # First-draft cities reach the UI as soon as each city node finishes
+        if on_fragment is not None and name.startswith("city:") and name.endswith("@0") \
+                and "error" not in output:
+            i = int(name[len("city:"):-len("@0")])
+            emit_city(on_fragment, output, allocation[i][0], offsets[i])
+
+    runner = GraphRunner(run_id, store, max_workers=FANOUT_MAX_WORKERS, on_node=on_node)
+
+    # Multi-city trips fan out one generation per city; trips whose cities
+    # are all in the fragment store are composed from it the same way.
+    # Decided once per run so a resumed run rebuilds the same graph.
+    def route(_):
+        fan_out = FANOUT_MIN_CITIES and len(destinations) >= FANOUT_MIN_CITIES
+        composed = bool(destinations) and len(cached_cities(user_input)) == len(destinations)
+        return "fragments" if fan_out or composed else "full"
+
+    mode = runner.run({"route": Node(route)})["route"]
+    generate = generate_itinerary_parallel if mode == "fragments" else generate_itinerary
+    router = get_router()
+
+    for loop in range(max_loops):
+        # Model tier for this loop, checkpointed so a resumed run keeps it
+        tier_node = f"tier@{loop}"
+        tier = runner.run({tier_node: Node(lambda out, loop=loop: router.pick(user_input, loop))})[tier_node]
+        model = router.tiers[min(tier, len(router.tiers) - 1)]
 
-    for _ in range(max_loops):
         # ---- 1️⃣ Itinerary Agent ----
-        itinerary = generate_itinerary(user_input)
+        draft = f"draft@{loop}"
+        fresh = loop > 0
+        with span("ItineraryAgent", loop=loop, mode="patch" if targets else mode,
+                  tier=tier, model=model) as attrs, use_model(model):
+            nodes = {}
+            if targets:
+                nodes[draft] = Node(lambda out, plan=state["plan"], targets=targets:
+                                    _patch(plan, user_input, targets, generate, attrs))
+            elif mode == "fragments":
+                glue = f"glue@{loop}"
+                cities = tuple(f"city:{i}@{loop}" for i in range(len(allocation)))
+                for name, (city, days) in zip(cities, allocation):
+                    nodes[name] = Node(lambda out, city=city, days=days, fresh=fresh:
+                                       plan_city(user_input, city, days, fresh))
+                nodes[glue] = Node(lambda out: generate_trip_glue(user_input))
+                nodes[draft] = Node(
+                    lambda out, cities=cities, glue=glue: compose_itinerary(
+                        user_input, allocation, [out[c] for c in cities], out[glue]),
+                    after=cities + (glue,),
+                )
+            else:
+                # Retries must not be answered from the cache with the same rejected plan
+                nodes[draft] = Node(lambda out, fresh=fresh: generate_itinerary(
+                    user_input,
+                    fresh=fresh,
+                    on_fragment=on_fragment if not fresh else None,
+                ))
+            itinerary = runner.run(nodes)[draft]
         if "error" in itinerary:
-            return {"error": "invalid_generation", "details": itinerary}
+            router.record_draft(model, valid=False)
+            return _finish({"error": "invalid_generation", "details": itinerary}, loop + 1)
 
-        state["plan"] = itinerary
-
-        # ---- 2️⃣ Budget Agent ----
-        state["plan"] = optimize_budget(state["plan"], budget)
-        total = calculate_total(state["plan"])
+        # ---- 2️⃣-4️⃣ Budget, Validation and Feedback agents ----
+        review = f"review@{loop}"
+        result = runner.run({
+            review: Node(lambda out, loop=loop, model=model: _review(out[draft], user_input, loop, model),
+                         after=(draft,)),
+        })[review]
+        state["plan"] = result["plan"]
+        errors = result["errors"]
+        targets = result["targets"]
 
         # Under-budget sanity
-        if total < budget * 0.10:
-            return {"error": "under_costed", "total_cost": total}
+        if result["total"] < budget * 0.10:
+            return _finish({"error": "under_costed", "total_cost": result["total"]}, loop + 1)
+
+        if result["valid"]:
+            harvest_fragments(state["plan"], user_input)
+            _accepted(tier, model)
+            return _finish(state["plan"], loop + 1)  # 🎯 SUCCESS
 
-        # ---- 3️⃣ Validation Agent ----
-        valid, errors = validate(state["plan"], user_input)
+    # ♻ After max refinement attempts → FAIL WITH REASONS
+    return _finish({"error": "validation_failed", "reasons": errors}, max_loops)
 
-        if valid:
-            return state["plan"]  # 🎯 SUCCESS
 
-        # ---- 4️⃣ Feedback Agent ----
-        state = refine_state(state, errors)
+def _patch(plan, user_input, targets, generate, attrs):
+    """
+    Draft node for refinement loops: regenerate only the failed parts,
+    falling back to a full (uncached) regeneration if that fails.
+    """
+    itinerary = regenerate_fragments(plan, user_input, targets)
+    if "error" in itinerary:
+        attrs["fragment_fallback"] = True
+        itinerary = generate(user_input, fresh=True)
+    return itinerary
 
-    # ♻ After max refinement attempts → FAIL WITH REASONS
-    return {"error": "validation_failed", "reasons": errors}
+
+def _review(itinerary, user_input, loop, model):
+    """
+    Review node: budget rebalancing, structural validation and, for an
+    invalid plan, feedback plus the parts to regenerate next loop.
+    The draft is parsed once and shared by the budget and validation stages.
+    Issues the feedback agent can repair locally (day numbering, missing
+    day cities, bad costs, duplicate hotels, duration) are fixed and the
+    plan re-checked before any part is sent back for regeneration.
+    The validation outcome is credited to the `model` that drafted it.
+    """
+    parsed = Itinerary.from_dict(itinerary)
+
+    # ---- 2️⃣ Budget Agent ----
+    with span("BudgetAgent", loop=loop) as attrs:
+        optimize_budget(parsed, user_input["budget"], user_input)
+        total = parsed.total
+        attrs["total_cost"] = total
+
+    # ---- 3️⃣ Validation Agent ----
+    with span("ValidationAgent", loop=loop) as attrs:
+        valid, issues = validate_plan(parsed, user_input)
+        attrs["errors"] = sum(issue.severity == "error" for issue in issues)
+        attrs["warnings"] = len(issues) - attrs["errors"]
+
+    # ---- 4️⃣ Feedback Agent: local repairs ----
+    if repairable(issues):
+        with span("FeedbackAgent", loop=loop, stage="repair") as attrs:
+            state = refine_state({"user": user_input, "plan": parsed.to_dict()}, issues)
+            attrs["repaired"] = state["repaired"]
+            parsed = Itinerary.from_dict(state["plan"])
+            # Clamped costs are lifted back to their floors
+            optimize_budget(parsed, user_input["budget"], user_input)
+            total = parsed.total
+            valid, issues = validate_plan(parsed, user_input)
+            attrs["valid"] = valid
+
+    plan = parsed.to_dict()
+    errors = [issue.message for issue in issues if issue.severity == "error"]
+    get_router().record_draft(model, valid)
+
+    targets = None
+    if not valid:
+        # ---- 4️⃣ Feedback Agent: what to regenerate ----
+        with span("FeedbackAgent", loop=loop, stage="locate") as attrs:
+            # Which parts to regenerate next loop (None → full regeneration)
+            located = locate_failures(plan, user_input)
+            if located and (located["days"] or located["cities"] or located["transport"]):
+                targets = located
+            attrs["targets"] = targets
+
+    return {"plan": plan, "total": total, "valid": valid, "errors": errors, "targets": targets}
+
+
+def _accepted(tier, model):
+    """
+    Record which model tier produced the accepted plan.
+    """
+    METRICS.inc("atlas_plans_by_tier_total", {"tier": tier, "model": model})
+    tr = current_trace()
+    if tr is not None:
+        tr.set(model_tier=tier, model=model)
+
+
+def _finish(result, loops):
+    """
+    Record the run's outcome on the current trace and the metrics registry.
+    """
+    outcome = result.get("error", "ok")
+    METRICS.inc("atlas_pipeline_runs_total", {"outcome": outcome})
+    METRICS.inc("atlas_pipeline_loops_total", value=loops)
+    tr = current_trace()
+    if tr is not None:
+        tr.set(loops=loops, outcome=outcome)
+        if outcome != "ok":
+            tr.set(failure=result.get("reasons") or result.get("details") or outcome)
+    return result
@@ -1,9 +1,25 @@
 from orchestrator import run_agentic_pipeline
+from agents.validation_agent import validate_request
+from config import TRIP_STORE_SERVE
+from utils.checkpoints import get_checkpoints
+from utils.payloads import normalize_payload, payload_key  # noqa: F401  (re-exported)
+from utils.tracing import trace, span
 
-def generate_plan(payload):
+def generate_plan(payload, on_fragment=None, with_trace=False, run_id=None, on_progress=None):
     """
     Agentic planner entrypoint.
     Accepts ONE dict payload from the Streamlit app.
+    `on_fragment(kind, entry)` is forwarded to the orchestrator for
+    progressive rendering of days / hotels while the plan streams in.
+    With `with_trace=True`, returns (plan, trace dict) instead of the plan.
+
+    With a `run_id` (see utils.checkpoints.new_run_id) the run is
+    checkpointed: calling again with the same run_id after a crash or an
+    interrupted Streamlit rerun resumes from the last finished node, and
+    a run that already finished returns its stored result.
+
+    `on_progress(stage, attrs)` is called as each stage span starts
+    (PreFlight, ItineraryAgent, BudgetAgent, ..., with its loop number).
 
     Expected payload structure:
     {
@@ -15,6 +31,35 @@ def generate_plan(payload):
     }
     """
 
+    with trace(on_progress) as tr:
+        if run_id is None:
+            plan = _plan(payload, on_fragment)
+        else:
+            tr.set(run_id=run_id)
+            plan = _checkpointed(payload, on_fragment, run_id)
+    if with_trace:
+        return plan, tr.to_dict()
+    return plan
+
+
+def _checkpointed(payload, on_fragment, run_id):
+    store = get_checkpoints()
+    run = store.load_run(run_id)
+    if run and run["status"] == "done":
+        return run["result"]
+
+    store.start_run(run_id, payload)
+    try:
+        plan = _plan(payload, on_fragment, run_id, store)
+    except BaseException as e:
+        # Also covers Streamlit's rerun/stop exceptions: the run stays resumable
+        store.finish_run(run_id, "failed", error=f"{type(e).__name__}: {e}")
+        raise
+    store.finish_run(run_id, "done", plan)
+    return plan
+
+
+def _plan(payload, on_fragment, run_id=None, store=None):
     source = payload.get("source")
     destinations = payload.get("destinations", [])
     budget = payload.get("budget")
@@ -25,7 +70,37 @@ def generate_plan(payload):
     if isinstance(destinations, str):
         destinations = [d.strip() for d in destinations.split(",") if d.strip()]
 
+    # Pre-flight: reject impossible requests before paying for any LLM call
+    with span("PreFlight"):
+        ok, errors = validate_request({
+            "destinations": destinations,
+            "duration": duration,
+            "budget": budget,
+            "travelers": travelers,
+        })
+    if not ok:
+        return {"error": "infeasible_request", "reasons": [issue.message for issue in errors]}
+
+    # A stored plan that fits is served instead of generating a new one
+    if TRIP_STORE_SERVE:
+        from utils.trip_store import get_trip_store  # deferred: loads pyarrow
+
+        with span("TripStore") as attrs:
+            stored = get_trip_store().lookup({
+                "source": source,
+                "destinations": destinations,
+                "duration": duration,
+                "budget": budget,
+                "travelers": travelers,
+            })
+            attrs["hit"] = stored is not None
+        if stored is not None:
+            return stored
+
     # Pass UNPACKED values to orchestrator
-    plan = run_agentic_pipeline(source, destinations, duration, budget, travelers)
+    plan = run_agentic_pipeline(
+        source, destinations, duration, budget, travelers, on_fragment=on_fragment,
+        run_id=run_id, store=store,
+    )
 
     return plan
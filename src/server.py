@@ -0,0 +1,223 @@
+"""
+Headless planning service: generate_plan over HTTP, so Streamlit and other
+frontends can be thin clients and workers scale separately from the UI.
+
+    python src/server.py --port 8080 --workers 4 --queue 16
+
+    POST /plan     body: one generate_plan payload → the plan (or its error) as JSON
+                   (400 if a field is missing or not a positive integer)
+    GET  /healthz  worker pool state and per-model router stats
+    GET  /metrics  Prometheus text
+
+Concurrent requests for the same trip (equal normalized payloads) share one
+pipeline run. When every worker is busy and `--queue` more runs are already
+waiting, new trips are answered 429 with a Retry-After estimate.
+"""
+import argparse
+import asyncio
+import json
+import math
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import tornado.ioloop
+import tornado.web
+
+from config import SERVER_PORT, SERVER_WORKERS, SERVER_QUEUE_SIZE
+from planner_core import generate_plan
+from utils.model_router import get_router
+from utils.payloads import normalize_payload, payload_key
+from utils.tracing import METRICS
+
+# Until a run has finished, Retry-After assumes runs take this long
+DEFAULT_RUN_S = 10.0
+
+
+def payload_errors(payload):
+    """
+    Reasons a normalized payload cannot be planned at all (missing cities,
+    non-numeric or non-positive counts); [] if it is well-formed.
+    """
+    reasons = []
+    if not payload["source"]:
+        reasons.append("source must be a non-empty string.")
+    if not payload["destinations"]:
+        reasons.append("destinations must list at least one city.")
+    for field in ("duration", "budget", "travelers"):
+        value = payload[field]
+        if not isinstance(value, int) or isinstance(value, bool):
+            reasons.append(f"{field} must be an integer.")
+        elif value < 1:
+            reasons.append(f"{field} must be at least 1.")
+    return reasons
+
+
+class Overloaded(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Planner is at capacity; retry in {retry_after}s.")
+        self.retry_after = retry_after
+
+
+class PlanService:
+    """
+    Bounded worker pool with single-flight coalescing.
+
+    `submit` returns (future, coalesced): a request whose normalized payload
+    is already in flight gets that run's future instead of a new run. At
+    most `workers` runs execute at once and `queue_size` more may wait;
+    beyond that `submit` raises Overloaded.
+    """
+
+    def __init__(self, workers=SERVER_WORKERS, queue_size=SERVER_QUEUE_SIZE, plan=generate_plan):
+        self.workers = workers
+        self.capacity = workers + queue_size
+        self.plan = plan
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="plan")
+        self.in_flight = {}
+        self.avg_run_s = None
+        self._lock = threading.Lock()
+
+    def submit(self, payload):
+        payload = normalize_payload(payload)
+        key = payload_key(payload)
+        with self._lock:
+            future = self.in_flight.get(key)
+            if future is not None:
+                METRICS.inc("atlas_server_requests_total", {"result": "coalesced"})
+                return future, True
+            if len(self.in_flight) >= self.capacity:
+                METRICS.inc("atlas_server_requests_total", {"result": "rejected"})
+                raise Overloaded(self.retry_after())
+            future = self.pool.submit(self._run, payload)
+            self.in_flight[key] = future
+        METRICS.inc("atlas_server_requests_total", {"result": "run"})
+        future.add_done_callback(lambda _: self._release(key))
+        return future, False
+
+    def _release(self, key):
+        with self._lock:
+            self.in_flight.pop(key, None)
+
+    def _run(self, payload):
+        start = time.perf_counter()
+        try:
+            result = self.plan(payload)
+        except Exception as e:
+            result = {"error": "pipeline_crash", "reasons": [str(e)]}
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            # Smoothed run time, for Retry-After
+            self.avg_run_s = elapsed if self.avg_run_s is None else 0.8 * self.avg_run_s + 0.2 * elapsed
+        return result
+
+    def retry_after(self):
+        """
+        Seconds until a worker is likely free for one more run (call with the lock held).
+        """
+        waiting = max(len(self.in_flight) - self.workers, 0)
+        rounds = math.ceil((waiting + 1) / self.workers)
+        return max(1, math.ceil(rounds * (self.avg_run_s or DEFAULT_RUN_S)))
+
+    def stats(self):
+        with self._lock:
+            in_flight = len(self.in_flight)
+            avg_run_s = self.avg_run_s
+        return {
+            "workers": self.workers,
+            "capacity": self.capacity,
+            "in_flight": in_flight,
+            "queued": max(in_flight - self.workers, 0),
+            "avg_run_s": round(avg_run_s, 3) if avg_run_s is not None else None,
+        }
+
+    def shutdown(self):
+        self.pool.shutdown(wait=True)
+
+
+class _Handler(tornado.web.RequestHandler):
+    def initialize(self, service):
+        self.service = service
+
+    def write_json(self, status, body):
+        self.set_status(status)
+        self.set_header("Content-Type", "application/json; charset=utf-8")
+        self.finish(json.dumps(body, ensure_ascii=False))
+
+
+class PlanHandler(_Handler):
+    async def post(self):
+        try:
+            payload = json.loads(self.request.body or b"null")
+        except ValueError:
+            payload = None
+        if not isinstance(payload, dict):
+            self.write_json(400, {"error": "invalid_payload", "reasons": ["Request body must be a JSON object."]})
+            return
+        payload = normalize_payload(payload)
+        reasons = payload_errors(payload)
+        if reasons:
+            self.write_json(400, {"error": "invalid_payload", "reasons": reasons})
+            return
+
+        try:
+            future, coalesced = self.service.submit(payload)
+        except Overloaded as e:
+            self.set_header("Retry-After", str(e.retry_after))
+            self.write_json(429, {"error": "overloaded", "reasons": [str(e)]})
+            return
+
+        plan = await asyncio.wrap_future(future)
+        self.set_header("X-Atlas-Coalesced", "1" if coalesced else "0")
+        if plan.get("error") == "pipeline_crash":
+            status = 500
+        elif "error" in plan:
+            status = 422
+        else:
+            status = 200
+        self.write_json(status, plan)
+
+
+class HealthHandler(_Handler):
+    def get(self):
+        self.write_json(200, dict(self.service.stats(), models=get_router().snapshot(), ok=True))
+
+
+class MetricsHandler(_Handler):
+    def get(self):
+        self.set_header("Content-Type", "text/plain; version=0.0.4")
+        self.finish(METRICS.export_prometheus())
+
+
+def make_app(service):
+    args = {"service": service}
+    return tornado.web.Application([
+        (r"/plan", PlanHandler, args),
+        (r"/healthz", HealthHandler, args),
+        (r"/metrics", MetricsHandler, args),
+    ])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the ATLAS planner over HTTP.")
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS, help="pipeline runs at once")
+    parser.add_argument("--queue", type=int, default=SERVER_QUEUE_SIZE, help="runs allowed to wait before 429s")
+    args = parser.parse_args(argv)
+
+    service = PlanService(args.workers, args.queue)
+    make_app(service).listen(args.port)
+    print(f"ATLAS planner listening on :{args.port} ({args.workers} workers, queue {args.queue})",
+          file=sys.stderr)
+    try:
+        tornado.ioloop.IOLoop.current().start()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,21 +1,37 @@
-from src.planner_core import generate_plan
+from planner_core import generate_plan
 import json
 
 def launch_cli():
     print("\nWelcome to ATLAS, your travel planner\nTo get started, please-\n")
-    destination = input("Enter your destination: ")
-    budget = input("Enter your total budget (INR or USD): ")
+    source = input("Enter your starting city: ")
+    destination = input("Enter your destination(s), comma separated: ")
+    budget = input("Enter your total budget (INR): ")
     travelers = input("Enter number of travelers: ")
     duration = input("Trip duration (in days): ")
 
+    payload = {
+        "source": source,
+        "destinations": destination,
+        "budget": int(budget),
+        "travelers": int(travelers),
+        "duration": int(duration),
+    }
+    from utils.trip_store import get_trip_store  # deferred: loads pyarrow
+
+    store = get_trip_store()
+
+    plan = store.lookup(payload)
+    if plan is not None and input("\nA saved trip fits these details. Use it? (y/n): ").lower() == 'y':
+        print(json.dumps(plan, indent=2, ensure_ascii=False))
+        return
+
     print("\nGenerating your personalized itinerary...\n")
-    plan = generate_plan(destination, budget, travelers, duration)
-    print(plan)
+    plan = generate_plan(payload)
     print(json.dumps(plan, indent=2, ensure_ascii=False))
+    if "error" in plan:
+        return
 
-    save = input("\nSave itinerary to file? (y/n): ")
+    save = input("\nSave itinerary to your trip library? (y/n): ")
     if save.lower() == 'y':
-        filename = f"itinerary_{destination.replace(' ','_')}.json"
-        with open(filename, "w", encoding="utf-8") as f:
-            json.dump(plan, f, indent=2, ensure_ascii=False)
-        print(f"Saved to {filename}")
\ No newline at end of file
+        trip_id, = store.append([(payload, plan)])
+        print(f"Saved to {store.root} as trip {trip_id}")
@@ -1,8 +1,260 @@
-import google.generativeai as genai
-from config import DEFAULT_MODEL
-import json
-
-def call_llm(prompt):
-    model = genai.GenerativeModel(DEFAULT_MODEL)
-    response = model.generate_content(prompt)
-    return response.text.strip()
\ No newline at end of file
+from config import (
+    LLM_BACKEND,
+    LLM_CACHE_ENABLED,
+    LLM_CACHE_DIR,
+    LLM_CACHE_TTL,
+    LLM_CACHE_MAX_BYTES,
+    LLM_CACHE_MEMORY_ITEMS,
+    LLM_RATE_PER_MIN,
+    LLM_BURST,
+    LLM_TIMEOUT_S,
+    LLM_MAX_RETRIES,
+    LLM_BACKOFF_BASE_S,
+    LLM_BACKOFF_MAX_S,
+    LLM_HEDGE,
+    LLM_HEDGE_AFTER_S,
+    require_api_key,
+)
+from utils.llm_backends import BACKENDS, LLMResponse
+from utils.llm_cache import ResponseCache, make_key
+from utils.model_router import current_model, get_router
+from utils.resilience import ResilientCaller, TokenBucket
+from utils.tracing import METRICS, current_trace, span
+import threading
+import time
+
+_cache = None
+_backend = None
+_caller = None
+_lock = threading.Lock()
+
+
+def get_backend():
+    """
+    Process-wide LLM backend selected by config.LLM_BACKEND, built on first use.
+    """
+    global _backend
+    if _backend is None:
+        with _lock:
+            if _backend is None:
+                if LLM_BACKEND not in BACKENDS:
+                    raise ValueError(f"Unknown LLM backend: {LLM_BACKEND}")
+                if LLM_BACKEND == "gemini":
+                    _backend = BACKENDS["gemini"](require_api_key())
+                else:
+                    _backend = BACKENDS[LLM_BACKEND]()
+    return _backend
+
+
+def set_backend(backend):
+    """
+    Swap the active backend (benchmarks, load tests, offline runs).
+    """
+    global _backend
+    with _lock:
+        _backend = backend
+
+
+def get_caller():
+    """
+    Process-wide call policy (rate limit, deadline, retries, hedging),
+    shared by every thread and asyncio task.
+    """
+    global _caller
+    if _caller is None:
+        with _lock:
+            if _caller is None:
+                _caller = ResilientCaller(
+                    TokenBucket(LLM_RATE_PER_MIN / 60.0, LLM_BURST),
+                    timeout=LLM_TIMEOUT_S,
+                    max_retries=LLM_MAX_RETRIES,
+                    backoff_base=LLM_BACKOFF_BASE_S,
+                    backoff_max=LLM_BACKOFF_MAX_S,
+                    hedge=LLM_HEDGE,
+                    hedge_after=LLM_HEDGE_AFTER_S,
+                )
+    return _caller
+
+
+def call_stats():
+    """
+    Counters for throttles, retries, timeouts and hedges (sent / won).
+    """
+    return get_caller().stats()
+
+
+def get_cache():
+    """
+    Process-wide response cache, built on first use.
+    """
+    global _cache
+    if _cache is None:
+        with _lock:
+            if _cache is None:
+                _cache = ResponseCache(
+                    LLM_CACHE_DIR,
+                    ttl=LLM_CACHE_TTL,
+                    max_bytes=LLM_CACHE_MAX_BYTES,
+                    max_items=LLM_CACHE_MEMORY_ITEMS,
+                )
+    return _cache
+
+
+def cache_stats():
+    return get_cache().stats()
+
+
+def _cache_key(prompt, generation_config, model):
+    if not LLM_CACHE_ENABLED:
+        return None
+    return make_key(f"{get_backend().name}/{model}", prompt, generation_config)
+
+
+def evict_cached(prompt, generation_config=None):
+    """
+    Drop a cached response, e.g. when it turned out to be unparseable.
+    """
+    key = _cache_key(prompt, generation_config, current_model())
+    if key:
+        get_cache().delete(key)
+
+
+def _record_usage(attrs, prompt, text, response=None, cached=False, purpose=None, model=None):
+    """
+    Attach prompt/response sizes and token counts to the call span,
+    the request trace and the process-wide counters (labelled by purpose,
+    so e.g. itinerary vs city_fragment prompt sizes can be compared).
+    """
+    prompt_tokens = response.prompt_tokens if response else 0
+    response_tokens = response.response_tokens if response else 0
+    labels = {"purpose": purpose or "other"}
+    attrs.update(
+        purpose=purpose,
+        model=model,
+        cache_hit=cached,
+        prompt_chars=len(prompt),
+        response_chars=len(text),
+        prompt_tokens=prompt_tokens,
+        response_tokens=response_tokens,
+    )
+    METRICS.inc("atlas_llm_calls_total", dict(labels, cache="hit" if cached else "miss"))
+    if response:
+        METRICS.inc("atlas_llm_prompt_tokens_total", labels, value=prompt_tokens)
+        METRICS.inc("atlas_llm_response_tokens_total", labels, value=response_tokens)
+
+    tr = current_trace()
+    if tr is not None:
+        tr.incr("llm_calls")
+        tr.incr("prompt_tokens", prompt_tokens)
+        tr.incr("response_tokens", response_tokens)
+
+
+def call_llm(prompt, generation_config=None, use_cache=True, purpose=None):
+    """
+    Send a prompt to the configured backend and return the response text.
+
+    The model is the one routed to by model_router.use_model (DEFAULT_MODEL
+    outside a cascade); its latency and failures feed the router's stats.
+    Responses are cached by (backend/model, normalized prompt, generation config).
+    `use_cache=False` skips the lookup but still stores the fresh answer,
+    which is what retry loops want. `purpose` labels the token counters.
+    """
+    model = current_model()
+    with span("call_llm") as attrs:
+        key = _cache_key(prompt, generation_config, model)
+
+        if key and use_cache:
+            cached = get_cache().get(key)
+            if cached is not None:
+                _record_usage(attrs, prompt, cached, cached=True, purpose=purpose, model=model)
+                return cached
+
+        backend = get_backend()
+        start = time.perf_counter()
+        try:
+            response = get_caller().call(
+                lambda timeout: backend.generate(prompt, model, generation_config, timeout=timeout)
+            )
+        except Exception:
+            get_router().record_call(model, time.perf_counter() - start, ok=False)
+            raise
+        get_router().record_call(model, time.perf_counter() - start, ok=True)
+        text = response.text
+        _record_usage(attrs, prompt, text, response, purpose=purpose, model=model)
+
+        if key and text:
+            get_cache().set(key, text)
+        return text
+
+
+async def acall_llm(prompt, generation_config=None, use_cache=True, purpose=None):
+    """
+    Async counterpart of call_llm, sharing the same cache, backend and routing.
+    """
+    model = current_model()
+    with span("call_llm", mode="async") as attrs:
+        key = _cache_key(prompt, generation_config, model)
+
+        if key and use_cache:
+            cached = get_cache().get(key)
+            if cached is not None:
+                _record_usage(attrs, prompt, cached, cached=True, purpose=purpose, model=model)
+                return cached
+
+        backend = get_backend()
+        start = time.perf_counter()
+        try:
+            response = await get_caller().acall(
+                lambda timeout: backend.agenerate(prompt, model, generation_config, timeout=timeout)
+            )
+        except Exception:
+            get_router().record_call(model, time.perf_counter() - start, ok=False)
+            raise
+        get_router().record_call(model, time.perf_counter() - start, ok=True)
+        text = response.text
+        _record_usage(attrs, prompt, text, response, purpose=purpose, model=model)
+
+        if key and text:
+            get_cache().set(key, text)
+        return text
+
+
+def stream_llm(prompt, generation_config=None, use_cache=True, purpose=None):
+    """
+    Streaming counterpart of call_llm: yields text chunks as they arrive.
+    A cache hit is yielded as one chunk; a completed stream is cached.
+    """
+    model = current_model()
+    with span("call_llm", mode="stream") as attrs:
+        key = _cache_key(prompt, generation_config, model)
+
+        if key and use_cache:
+            cached = get_cache().get(key)
+            if cached is not None:
+                _record_usage(attrs, prompt, cached, cached=True, purpose=purpose, model=model)
+                yield cached
+                return
+
+        # Streams share the rate limit; retries/hedging do not apply mid-stream
+        get_caller().limiter.acquire()
+        chunks = []
+        usage = {}
+        first_chunk_ms = None
+        start = time.perf_counter()
+        try:
+            for chunk in get_backend().stream(prompt, model, generation_config, usage=usage):
+                if first_chunk_ms is None:
+                    first_chunk_ms = round((time.perf_counter() - start) * 1000, 3)
+                chunks.append(chunk)
+                yield chunk
+        except Exception:
+            get_router().record_call(model, time.perf_counter() - start, ok=False)
+            raise
+        get_router().record_call(model, time.perf_counter() - start, ok=True)
+
+        text = "".join(chunks).strip()
+        attrs["first_chunk_ms"] = first_chunk_ms
+        _record_usage(attrs, prompt, text, LLMResponse(text, **usage), purpose=purpose, model=model)
+
+        if key and text:
+            get_cache().set(key, text)
@@ -0,0 +1,160 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from config import CHECKPOINT_DB, CHECKPOINT_TTL
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id  TEXT PRIMARY KEY,
+    status  TEXT NOT NULL,
+    payload TEXT,
+    result  TEXT,
+    error   TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS nodes (
+    run_id  TEXT NOT NULL,
+    node    TEXT NOT NULL,
+    output  TEXT NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (run_id, node)
+);
+"""
+
+
+def new_run_id():
+    return uuid.uuid4().hex[:16]
+
+
+class CheckpointStore:
+    """
+    SQLite record of pipeline runs and their completed nodes.
+
+    runs:  run_id → status ("running" / "done" / "failed"), payload, result
+    nodes: (run_id, node name) → JSON output of that node
+
+    Each operation opens its own short-lived connection, so the store can
+    be shared freely between threads (and processes).
+    """
+
+    def __init__(self, path, ttl=CHECKPOINT_TTL):
+        self.path = path
+        self.ttl = ttl
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(_SCHEMA)
+        self.prune()
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    # ---- runs ----
+    def start_run(self, run_id, payload):
+        """
+        Register a run (or mark an existing one running again).
+        Returns True if the run already existed, i.e. this is a resume.
+        """
+        now = time.time()
+        with self._connect() as db:
+            existed = db.execute("SELECT 1 FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+            if existed:
+                db.execute("UPDATE runs SET status = 'running', error = NULL, updated = ? WHERE run_id = ?",
+                           (now, run_id))
+            else:
+                db.execute("INSERT INTO runs VALUES (?, 'running', ?, NULL, NULL, ?, ?)",
+                           (run_id, json.dumps(payload, ensure_ascii=False), now, now))
+        return bool(existed)
+
+    def finish_run(self, run_id, status, result=None, error=None):
+        with self._connect() as db:
+            db.execute(
+                "UPDATE runs SET status = ?, result = ?, error = ?, updated = ? WHERE run_id = ?",
+                (status, json.dumps(result, ensure_ascii=False) if result is not None else None,
+                 error, time.time(), run_id),
+            )
+
+    def load_run(self, run_id):
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT run_id, status, payload, result, error, created, updated FROM runs WHERE run_id = ?",
+                (run_id,),
+            ).fetchone()
+        return _run_dict(row) if row else None
+
+    def list_runs(self, status=None, limit=50):
+        query = "SELECT run_id, status, payload, result, error, created, updated FROM runs"
+        args = ()
+        if status:
+            query += " WHERE status = ?"
+            args = (status,)
+        query += " ORDER BY updated DESC LIMIT ?"
+        with self._connect() as db:
+            rows = db.execute(query, args + (limit,)).fetchall()
+        return [_run_dict(row) for row in rows]
+
+    # ---- nodes ----
+    def save_node(self, run_id, node, output):
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO nodes VALUES (?, ?, ?, ?)",
+                (run_id, node, json.dumps(output, ensure_ascii=False), time.time()),
+            )
+
+    def load_nodes(self, run_id):
+        with self._connect() as db:
+            rows = db.execute("SELECT node, output FROM nodes WHERE run_id = ?", (run_id,)).fetchall()
+        return {node: json.loads(output) for node, output in rows}
+
+    # ---- housekeeping ----
+    def prune(self):
+        """
+        Drop runs (and their nodes) not touched within the TTL.
+        """
+        cutoff = time.time() - self.ttl
+        with self._connect() as db:
+            db.execute("DELETE FROM nodes WHERE run_id IN (SELECT run_id FROM runs WHERE updated < ?)", (cutoff,))
+            db.execute("DELETE FROM runs WHERE updated < ?", (cutoff,))
+
+
+def _run_dict(row):
+    run_id, status, payload, result, error, created, updated = row
+    return {
+        "run_id": run_id,
+        "status": status,
+        "payload": json.loads(payload) if payload else None,
+        "result": json.loads(result) if result else None,
+        "error": error,
+        "created": created,
+        "updated": updated,
+    }
+
+
+_store = None
+_lock = threading.Lock()
+
+
+def get_checkpoints():
+    """
+    Process-wide checkpoint store, built on first use.
+    """
+    global _store
+    if _store is None:
+        with _lock:
+            if _store is None:
+                _store = CheckpointStore(CHECKPOINT_DB)
+    return _store
@@ -0,0 +1,119 @@
+import copy
+import threading
+from bisect import bisect_right
+
+from config import (
+    FRAGMENT_CACHE_ENABLED,
+    FRAGMENT_CACHE_DIR,
+    FRAGMENT_CACHE_TTL,
+    FRAGMENT_CACHE_MAX_BYTES,
+)
+from utils.llm_cache import ResponseCache, make_key
+from utils.tracing import METRICS, current_trace
+
+# Budget per traveler per day (INR) → tier; tier i covers [BOUNDS[i-1], BOUNDS[i])
+BUDGET_TIER_BOUNDS = (1500, 3000, 6000, 12000, 25000)
+
+
+def budget_tier(share, days, travelers):
+    per_head_day = share / max(days, 1) / max(travelers, 1)
+    return bisect_right(BUDGET_TIER_BOUNDS, per_head_day)
+
+
+def traveler_band(travelers):
+    if travelers <= 2:
+        return str(max(travelers, 1))
+    return "3-4" if travelers <= 4 else "5+"
+
+
+def fragment_key(city, days, share, travelers):
+    """
+    (city, days, budget tier, traveler band): trips that differ only in
+    the exact budget or party size within a band share one fragment.
+    """
+    return (city.strip().lower(), days, budget_tier(share, days, travelers), traveler_band(travelers))
+
+
+def is_reusable(fragment, days):
+    """
+    Only fragments that would pass validation are stored: one entry per
+    day, each with activities and a non-negative cost, and a named hotel.
+    """
+    entries = fragment.get("per_day_breakdown")
+    if not isinstance(entries, list) or len(entries) != days:
+        return False
+    for entry in entries:
+        if not isinstance(entry, dict) or not entry.get("activities"):
+            return False
+        cost = entry.get("estimated_cost")
+        if not isinstance(cost, (int, float)) or isinstance(cost, bool) or cost < 0:
+            return False
+    hotel = fragment.get("hotel")
+    return isinstance(hotel, dict) and bool(hotel.get("hotel"))
+
+
+class FragmentStore:
+    """
+    Validated per-city fragments ({"per_day_breakdown", "hotel", "share"})
+    on the same memory + disk tiers as the LLM response cache. A hit is
+    rescaled from the budget share it was generated for to the one asked for.
+    """
+
+    def __init__(self, directory, ttl, max_bytes, max_items=512):
+        self.cache = ResponseCache(directory, ttl=ttl, max_bytes=max_bytes, max_items=max_items)
+
+    @staticmethod
+    def _key(city, days, share, travelers):
+        return make_key("fragment", "|".join(map(str, fragment_key(city, days, share, travelers))))
+
+    def get(self, city, days, share, travelers):
+        stored = self.cache.get(self._key(city, days, share, travelers))
+        _count("hit" if stored is not None else "miss")
+        if stored is None:
+            return None
+        fragment = copy.deepcopy(stored)
+        factor = share / stored["share"] if stored.get("share") else 1
+        if factor != 1:
+            for entry in fragment["per_day_breakdown"]:
+                entry["estimated_cost"] = int(entry["estimated_cost"] * factor)
+            if isinstance(fragment["hotel"].get("estimated_cost"), (int, float)):
+                fragment["hotel"]["estimated_cost"] = int(fragment["hotel"]["estimated_cost"] * factor)
+        fragment["share"] = share
+        return fragment
+
+    def put(self, city, days, share, travelers, fragment):
+        if not is_reusable(fragment, days):
+            return False
+        self.cache.set(self._key(city, days, share, travelers), dict(fragment, share=share))
+        return True
+
+    def has(self, city, days, share, travelers):
+        return self.cache.get(self._key(city, days, share, travelers)) is not None
+
+    def stats(self):
+        return self.cache.stats()
+
+
+def _count(result):
+    METRICS.inc("atlas_fragment_cache_total", {"result": result})
+    tr = current_trace()
+    if tr is not None:
+        tr.incr("fragment_hits" if result == "hit" else "fragment_misses")
+
+
+_store = None
+_lock = threading.Lock()
+
+
+def get_store():
+    """
+    Process-wide fragment store, or None when disabled.
+    """
+    global _store
+    if not FRAGMENT_CACHE_ENABLED:
+        return None
+    if _store is None:
+        with _lock:
+            if _store is None:
+                _store = FragmentStore(FRAGMENT_CACHE_DIR, FRAGMENT_CACHE_TTL, FRAGMENT_CACHE_MAX_BYTES)
+    return _store
@@ -0,0 +1,141 @@
+import csv
+import re
+import threading
+from array import array
+from collections import namedtuple
+from functools import lru_cache
+
+from config import GAZETTEER_PATH
+
+REGIONS = ("domestic", "asia", "long_haul")
+
+Place = namedtuple("Place", "name country region lat lon")
+
+_TOKEN = re.compile(r"\w+")
+_END = ""  # trie key marking "a place name ends here"
+
+
+def tokenize(text):
+    """
+    Lower-cased word tokens; punctuation and apostrophes split words, so
+    "Romeo's Bay" is ["romeo", "s", "bay"] and never matches "rome".
+    """
+    return _TOKEN.findall(text.lower())
+
+
+class GazetteerIndex:
+    """
+    Places stored column-wise (names/countries as lists, region codes and
+    coordinates in typed arrays) plus a token trie over every name and
+    alias. Matching walks the trie once per token position, so the cost
+    depends on the length of the query, not on the size of the gazetteer.
+    """
+
+    def __init__(self, rows):
+        self.names = []
+        self.countries = []
+        self.regions = array("B")
+        self.lat = array("d")
+        self.lon = array("d")
+        self.trie = {}
+
+        for row in rows:
+            idx = len(self.names)
+            self.names.append(row["name"])
+            self.countries.append(row["country"])
+            self.regions.append(REGIONS.index(row["region"]))
+            self.lat.append(float(row["lat"]))
+            self.lon.append(float(row["lon"]))
+
+            aliases = [a for a in (row.get("aliases") or "").split("|") if a]
+            for label in [row["name"]] + aliases:
+                self._insert(tokenize(label), idx)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            return cls(csv.DictReader(f))
+
+    def __len__(self):
+        return len(self.names)
+
+    def _insert(self, tokens, idx):
+        if not tokens:
+            return
+        node = self.trie
+        for tok in tokens:
+            node = node.setdefault(tok, {})
+        # First definition wins if two rows share a label
+        node.setdefault(_END, idx)
+
+    def place(self, idx):
+        return Place(self.names[idx], self.countries[idx], REGIONS[self.regions[idx]],
+                     self.lat[idx], self.lon[idx])
+
+    def matches(self, text):
+        """
+        Indices of places mentioned in `text`, left to right. At each
+        position the longest name wins ("new york city" over "york"), and
+        matched tokens are consumed.
+        """
+        tokens = tokenize(text)
+        found = []
+        i = 0
+        while i < len(tokens):
+            node = self.trie
+            best = None
+            j = i
+            while j < len(tokens) and tokens[j] in node:
+                node = node[tokens[j]]
+                j += 1
+                if _END in node:
+                    best = (node[_END], j)
+            if best is None:
+                i += 1
+            else:
+                found.append(best[0])
+                i = best[1]
+        return found
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = GazetteerIndex.load(GAZETTEER_PATH)
+    return _index
+
+
+@lru_cache(maxsize=4096)
+def lookup(destination):
+    """
+    Best gazetteer entry for a destination string, or None if nothing matches.
+
+    When several places are named, the last one wins: destinations are
+    written most-specific-first ("Paris Hotel, Goa", "Kandy, Sri Lanka"),
+    so the trailing place is the one that locates the trip. A trailing
+    country that merely qualifies the place before it ("Kandy, Sri Lanka")
+    yields that place instead.
+    """
+    index = get_index()
+    found = index.matches(destination)
+    if not found:
+        return None
+    best = found[-1]
+    if len(found) > 1 and index.names[best] == index.countries[best] \
+            and index.countries[found[-2]] == index.countries[best]:
+        best = found[-2]
+    return index.place(best)
+
+
+def region_of(destination):
+    """
+    "domestic" / "asia" / "long_haul", or None for unknown places.
+    """
+    place = lookup(destination)
+    return place.region if place else None
@@ -0,0 +1,113 @@
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from utils.tracing import METRICS, current_trace, propagate
+
+# fn(outputs) → JSON-serializable output; `after` names the nodes it needs
+Node = namedtuple("Node", "fn after", defaults=((),))
+
+
+def node_kind(name):
+    """
+    "city:Goa@0" → "city": the label used for metrics.
+    """
+    return name.split("@")[0].split(":")[0]
+
+
+class GraphRunner:
+    """
+    Runs graphs of pipeline nodes for one run ID, checkpointing every
+    finished node so a failed or interrupted run resumes where it stopped.
+
+        runner = GraphRunner(run_id, store)
+        out = runner.run({
+            "city:Goa@0": Node(lambda out: ...),
+            "glue@0":     Node(lambda out: ...),
+            "draft@0":    Node(merge, after=("city:Goa@0", "glue@0")),
+        })
+
+    `run` can be called repeatedly on the same runner (one call per stage
+    of the pipeline); node names must be stable across attempts of a run.
+    Nodes whose output is already checkpointed are not run again. Ready
+    nodes run concurrently on a thread pool, except that a lone ready node
+    runs on the calling thread (so UI callbacks inside it stay on the
+    caller's thread). `on_node(name, output)` is always called from the
+    calling thread, for restored and freshly run nodes alike.
+
+    If a node raises, nodes already running are allowed to finish (and are
+    checkpointed) before the first error is re-raised.
+    """
+
+    def __init__(self, run_id=None, store=None, max_workers=8, on_node=None):
+        self.run_id = run_id
+        self.store = store if run_id else None
+        self.max_workers = max_workers
+        self.on_node = on_node
+        self.outputs = self.store.load_nodes(run_id) if self.store else {}
+        self.restored = set(self.outputs)
+
+    def _finished(self, name, output, restored=False):
+        self.outputs[name] = output
+        if self.store and not restored:
+            self.store.save_node(self.run_id, name, output)
+        METRICS.inc("atlas_graph_nodes_total",
+                    {"node": node_kind(name), "result": "restored" if restored else "run"})
+        if restored:
+            tr = current_trace()
+            if tr is not None:
+                tr.incr("nodes_restored")
+        if self.on_node:
+            self.on_node(name, output)
+
+    def run(self, nodes):
+        """
+        Run `nodes` ({name: Node}) to completion; returns {name: output}.
+        """
+        pending = {}
+        for name, node in nodes.items():
+            if name in self.restored:
+                self._finished(name, self.outputs[name], restored=True)
+            else:
+                pending[name] = node
+
+        running = {}
+        errors = []
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="node") as pool:
+            while pending or running:
+                ready = [
+                    name for name, node in pending.items()
+                    if not errors and all(dep in self.outputs for dep in node.after)
+                ]
+                if not ready and not running:
+                    if errors:
+                        break
+                    raise ValueError(f"Unsatisfiable graph dependencies: {sorted(pending)}")
+
+                if len(ready) == 1 and not running:
+                    name = ready[0]
+                    node = pending.pop(name)
+                    try:
+                        output = node.fn(self.outputs)
+                    except Exception as e:
+                        METRICS.inc("atlas_graph_nodes_total", {"node": node_kind(name), "result": "failed"})
+                        errors.append(e)
+                        break
+                    self._finished(name, output)
+                    continue
+
+                for name in ready:
+                    node = pending.pop(name)
+                    running[pool.submit(propagate(node.fn), self.outputs)] = name
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    if future.exception() is not None:
+                        METRICS.inc("atlas_graph_nodes_total", {"node": node_kind(name), "result": "failed"})
+                        errors.append(future.exception())
+                    else:
+                        self._finished(name, future.result())
+
+        if errors:
+            raise errors[0]
+        return {name: self.outputs[name] for name in nodes}
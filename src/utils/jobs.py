@@ -0,0 +1,346 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from config import JOB_DB, JOB_WORKERS, JOB_LEASE_S, JOB_TTL, JOB_POLL_S
+from utils.checkpoints import new_run_id
+from utils.tracing import METRICS
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id   TEXT PRIMARY KEY,
+    status   TEXT NOT NULL,
+    payload  TEXT NOT NULL,
+    progress TEXT,
+    result   TEXT,
+    trace    TEXT,
+    error    TEXT,
+    created  REAL NOT NULL,
+    updated  REAL NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created);
+"""
+
+# Queued jobs are claimed highest priority first, then oldest first;
+# speculative jobs (queued before the user asked) yield to everything else
+PRIORITY_SPECULATIVE = -1
+
+_COLUMNS = "job_id, status, payload, progress, result, trace, error, created, updated"
+
+# Spans reported as job progress (LLM calls etc. are too fine-grained)
+STAGES = ("PreFlight", "ItineraryAgent", "BudgetAgent", "ValidationAgent", "FeedbackAgent")
+
+
+class Cancelled(Exception):
+    pass
+
+
+class JobQueue:
+    """
+    Persistent SQLite queue of planning jobs, run by a pool of worker threads.
+
+    status:   "queued" → "running" → "done" / "failed" (or "cancelled")
+    progress: {"stage": "ItineraryAgent", "loop": 0, "fragments": [[kind, entry], ...]}
+    result:   generate_plan's return value (a plan or a structured error)
+
+    Job IDs double as checkpoint run IDs, so a job that is requeued (its
+    lease expired because the process running it died) or retried after a
+    crash resumes from its last finished pipeline node. Workers renew the
+    lease of the jobs they hold every lease / 3 seconds. At most
+    `speculative` speculative jobs run at once (default: all workers but
+    one), so a job the user is waiting for always finds a free worker. A
+    cancelled job
+    stops at its next pipeline stage and can be retried the same way. Any
+    process sharing the database may submit, poll or work on jobs.
+    """
+
+    def __init__(self, path, workers=JOB_WORKERS, lease=JOB_LEASE_S, ttl=JOB_TTL, plan=None,
+                 speculative=None):
+        self.path = path
+        self.workers = workers
+        self.speculative = max(workers - 1, 1) if speculative is None else speculative
+        self.lease = lease
+        self.ttl = ttl
+        self.plan = plan
+        self._threads = []
+        self._running = set()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(_SCHEMA)
+            columns = {row[1] for row in db.execute("PRAGMA table_info(jobs)")}
+            if "priority" not in columns:
+                # Databases from before job priorities
+                db.execute("ALTER TABLE jobs ADD COLUMN priority INTEGER NOT NULL DEFAULT 0")
+            db.execute("CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, priority, created)")
+        self.prune()
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    # ---- clients ----
+    def submit(self, payload, job_id=None, priority=0):
+        """
+        Queue a generate_plan payload; returns its job ID.
+        """
+        job_id = job_id or new_run_id()
+        now = time.time()
+        with self._connect() as db:
+            db.execute(
+                "INSERT INTO jobs (job_id, status, payload, created, updated, priority) "
+                "VALUES (?, 'queued', ?, ?, ?, ?)",
+                (job_id, json.dumps(payload, ensure_ascii=False), now, now, priority),
+            )
+        METRICS.inc("atlas_jobs_total", {"status": "queued"})
+        self._wake.set()
+        return job_id
+
+    def retry(self, job_id):
+        """
+        Requeue a failed or cancelled job (it resumes from its checkpoints).
+        Returns False if the job does not exist or is not in either state.
+        """
+        with self._connect() as db:
+            changed = db.execute(
+                "UPDATE jobs SET status = 'queued', error = NULL, updated = ? "
+                "WHERE job_id = ? AND status IN ('failed', 'cancelled')",
+                (time.time(), job_id),
+            ).rowcount
+        if changed:
+            self._wake.set()
+        return bool(changed)
+
+    def cancel(self, job_id):
+        """
+        Cancel a queued or running job. A running job stops when its next
+        pipeline stage starts. Returns False if the job had already ended.
+        """
+        with self._connect() as db:
+            changed = db.execute(
+                "UPDATE jobs SET status = 'cancelled', updated = ? "
+                "WHERE job_id = ? AND status IN ('queued', 'running')",
+                (time.time(), job_id),
+            ).rowcount
+        if changed:
+            METRICS.inc("atlas_jobs_total", {"status": "cancelled"})
+        return bool(changed)
+
+    def promote(self, job_id, priority=0):
+        """
+        Raise a job's priority (e.g. once a speculative job is asked for).
+        """
+        with self._connect() as db:
+            db.execute("UPDATE jobs SET priority = ? WHERE job_id = ? AND priority < ?",
+                       (priority, job_id, priority))
+
+    def get(self, job_id):
+        with self._connect() as db:
+            row = db.execute(f"SELECT {_COLUMNS} FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return _job_dict(row) if row else None
+
+    def stats(self):
+        with self._connect() as db:
+            rows = db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
+
+    # ---- workers ----
+    def start(self):
+        """
+        Start the worker threads (idempotent).
+        """
+        if self._threads:
+            return self
+        targets = [(f"job-{i}", self._work) for i in range(self.workers)]
+        for name, target in targets + [("job-heartbeat", self._heartbeat)]:
+            t = threading.Thread(target=target, name=name, daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def stop(self, timeout=None):
+        """
+        Let workers finish their current job, then stop them.
+        """
+        self._stop.set()
+        self._wake.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+        self._stop.clear()
+
+    def _work(self):
+        while not self._stop.is_set():
+            job = self._claim()
+            if job is None:
+                # Jobs may also be submitted by other processes: poll as well
+                self._wake.wait(JOB_POLL_S)
+                self._wake.clear()
+                continue
+            self._running.add(job[0])
+            try:
+                self._run(*job)
+            finally:
+                self._running.discard(job[0])
+
+    def _heartbeat(self):
+        while not self._stop.wait(self.lease / 3):
+            held = list(self._running)
+            if not held:
+                continue
+            with self._connect() as db:
+                db.execute(
+                    f"UPDATE jobs SET updated = ? WHERE status = 'running' "
+                    f"AND job_id IN ({','.join('?' * len(held))})",
+                    [time.time()] + held,
+                )
+
+    def _claim(self):
+        """
+        Atomically take the next queued job (first requeueing running
+        jobs whose lease expired). Speculative jobs are skipped while
+        `speculative` of them are already running. Returns (job_id,
+        payload) or None.
+        """
+        now = time.time()
+        with self._connect() as db:
+            db.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running' AND updated < ?",
+                       (now - self.lease,))
+            row = db.execute(
+                "UPDATE jobs SET status = 'running', updated = ? WHERE job_id = "
+                "(SELECT job_id FROM jobs WHERE status = 'queued' AND (priority >= 0 OR "
+                "(SELECT COUNT(*) FROM jobs WHERE status = 'running' AND priority < 0) < ?) "
+                "ORDER BY priority DESC, created LIMIT 1) "
+                "RETURNING job_id, payload",
+                (now, self.speculative),
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def _run(self, job_id, payload):
+        plan = self.plan
+        if plan is None:
+            # Deferred so processes that only submit / poll never load the planner
+            from planner_core import generate_plan as plan
+
+        progress = _Progress(self, job_id)
+        try:
+            result, trace = plan(payload, on_fragment=progress.fragment, with_trace=True,
+                                 run_id=job_id, on_progress=progress.stage)
+        except Cancelled:
+            # Cancelled (or requeued) meanwhile: leave it as it is; its
+            # checkpoints stay for a retry
+            return
+        except Exception as e:
+            self._finish(job_id, "failed", error=f"{type(e).__name__}: {e}")
+            return
+        self._finish(job_id, "done", result, trace)
+
+    def _update(self, job_id, progress):
+        """
+        Save a running job's progress; False if it is no longer running
+        (cancelled, or requeued after losing its lease).
+        """
+        with self._connect() as db:
+            return bool(db.execute(
+                "UPDATE jobs SET progress = ?, updated = ? WHERE job_id = ? AND status = 'running'",
+                (json.dumps(progress, ensure_ascii=False), time.time(), job_id),
+            ).rowcount)
+
+    def _finish(self, job_id, status, result=None, trace=None, error=None):
+        # Only while still running: a job cancelled meanwhile stays
+        # cancelled, and one requeued after losing its lease is another
+        # worker's to finish
+        with self._connect() as db:
+            changed = db.execute(
+                "UPDATE jobs SET status = ?, result = ?, trace = ?, error = ?, updated = ? "
+                "WHERE job_id = ? AND status = 'running'",
+                (status,
+                 json.dumps(result, ensure_ascii=False) if result is not None else None,
+                 json.dumps(trace, ensure_ascii=False) if trace is not None else None,
+                 error, time.time(), job_id),
+            ).rowcount
+        if changed:
+            METRICS.inc("atlas_jobs_total", {"status": status})
+
+    # ---- housekeeping ----
+    def prune(self):
+        """
+        Drop finished jobs not touched within the TTL.
+        """
+        with self._connect() as db:
+            db.execute("DELETE FROM jobs WHERE status IN ('done', 'failed', 'cancelled') AND updated < ?",
+                       (time.time() - self.ttl,))
+
+
+class _Progress:
+    """
+    Collects one job's stage / loop and first-draft fragments and writes
+    them through to the queue (callbacks may arrive from several threads).
+    Starting a stage of a job that is no longer running raises Cancelled.
+    """
+
+    def __init__(self, queue, job_id):
+        self.queue = queue
+        self.job_id = job_id
+        self.state = {"stage": None, "loop": None, "fragments": []}
+        self._lock = threading.Lock()
+
+    def stage(self, name, attrs):
+        if name not in STAGES:
+            return
+        with self._lock:
+            self.state["stage"] = name
+            self.state["loop"] = attrs.get("loop")
+            if not self.queue._update(self.job_id, self.state):
+                raise Cancelled(self.job_id)
+
+    def fragment(self, kind, entry):
+        with self._lock:
+            self.state["fragments"].append([kind, entry])
+            self.queue._update(self.job_id, self.state)
+
+
+def _job_dict(row):
+    job_id, status, payload, progress, result, trace, error, created, updated = row
+    return {
+        "job_id": job_id,
+        "status": status,
+        "payload": json.loads(payload),
+        "progress": json.loads(progress) if progress else None,
+        "result": json.loads(result) if result else None,
+        "trace": json.loads(trace) if trace else None,
+        "error": error,
+        "created": created,
+        "updated": updated,
+    }
+
+
+_queue = None
+_lock = threading.Lock()
+
+
+def get_jobs():
+    """
+    Process-wide job queue with its workers running, built on first use.
+    """
+    global _queue
+    if _queue is None:
+        with _lock:
+            if _queue is None:
+                _queue = JobQueue(JOB_DB).start()
+    return _queue
@@ -0,0 +1,241 @@
+import json
+import re
+
+_CLOSER = {"{": "}", "[": "]"}
+_CONTROL_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}
+_SCALAR_END = ' \t\r\n,:]}"{['
+_SCALAR = re.compile(r"-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?|true|false|null")
+
+
+class IncrementalJSONParser:
+    """
+    Single-pass, chunk-fed parser/repairer for a JSON object in LLM output.
+
+        parser = IncrementalJSONParser(watch={"per_day_breakdown"})
+        for chunk in stream:
+            for key, item in parser.feed(chunk):
+                ...                      # complete elements of watched arrays
+        plan = parser.result()           # largest valid prefix, repaired
+
+    While scanning it:
+    - ignores everything before the first "{" and after the matching "}"
+      (markdown fences, prose),
+    - drops trailing commas and escapes raw control characters in strings,
+    - skips doubled or stray commas and colons, and inserts missing ones
+      between members / elements and after keys,
+    - stops at anything it cannot repair (a non-string key, a key with no
+      value, a bare word or malformed number) and keeps the valid prefix
+      before it,
+    - remembers the last point where the text could be cut and closed into
+      valid JSON without keeping a half-written element.
+
+    `result()` closes any unterminated arrays/objects at that point, so a
+    truncated response keeps every complete top-level member and every
+    complete element of top-level arrays. `intact_keys` lists the top-level
+    keys whose values were fully received. Each character is handled once,
+    so cost stays linear in the output size.
+    """
+
+    def __init__(self, watch=()):
+        self.watch = set(watch)
+        self.out = []
+        self.stack = []          # frames: [opening char, what comes next]
+        self.nested_objects = 0  # "{" frames below the root object
+        self.started = False
+        self.complete = False
+        self.broken = False
+        self.in_string = False
+        self.escape = False
+        self.string_is_key = False
+        self.key_start = 0
+        self.in_scalar = False
+        self.scalar_start = 0
+        self.pending_comma = False
+        self.root_key = None
+        self.item_start = None
+        self.intact_keys = []
+        self.safe_len = 0
+        self.safe_closers = ""
+        self._events = []
+
+    # ---- public API ----
+    def feed(self, chunk):
+        """
+        Consume a chunk of text. Returns [(array key, element), ...] for
+        watched top-level arrays whose elements completed in this chunk.
+        """
+        self._events = []
+        for ch in chunk:
+            if self.complete or self.broken:
+                break
+            self._step(ch)
+        return self._events
+
+    def feed_all(self, text):
+        """
+        Feed a complete text and return result().
+        """
+        self.feed(text)
+        return self.result()
+
+    def result(self):
+        """
+        The parsed object, or the repaired largest valid prefix if the
+        input was truncated. None if nothing usable was found.
+        """
+        if not self.started:
+            return None
+        if self.complete:
+            text = "".join(self.out)
+        else:
+            text = "".join(self.out[:self.safe_len]) + self.safe_closers
+        try:
+            return json.loads(text)
+        except ValueError:
+            return None
+
+    # ---- scanner ----
+    def _step(self, ch):
+        out = self.out
+
+        if not self.started:
+            if ch == "{":
+                self.started = True
+                out.append(ch)
+                self.stack.append(["{", "key"])
+                self._mark_safe()
+            return
+
+        if self.in_string:
+            if self.escape:
+                self.escape = False
+                out.append(ch)
+            elif ch == "\\":
+                self.escape = True
+                out.append(ch)
+            elif ch == '"':
+                out.append(ch)
+                self.in_string = False
+                if self.string_is_key:
+                    self.stack[-1][1] = "colon"
+                    if len(self.stack) == 1:
+                        self.root_key = json.loads("".join(out[self.key_start:]))
+                else:
+                    self._value_done()
+            elif ch < " ":
+                out.append(_CONTROL_ESCAPES.get(ch, "\\u%04x" % ord(ch)))
+            else:
+                out.append(ch)
+            return
+
+        if self.in_scalar:
+            if ch not in _SCALAR_END:
+                out.append(ch)
+                return
+            self.in_scalar = False
+            if not _SCALAR.fullmatch("".join(out[self.scalar_start:])):
+                # Not a number / true / false / null: keep what came before it
+                self.broken = True
+                return
+            self._value_done()
+
+        if ch in " \t\r\n":
+            return
+
+        frame = self.stack[-1]
+        opened, expecting = frame
+
+        if ch == ",":
+            # Doubled or stray commas are skipped
+            if expecting == "comma":
+                self.pending_comma = True
+                frame[1] = "key" if opened == "{" else "value"
+            return
+        if ch == ":":
+            # So are stray colons
+            if expecting == "colon":
+                out.append(ch)
+                frame[1] = "value"
+            return
+
+        if ch in "}]":
+            if opened == "{" and expecting in ("colon", "value"):
+                # A key without a value: keep what came before it
+                self.broken = True
+                return
+            self.pending_comma = False  # trailing comma
+            self.stack.pop()
+            out.append(_CLOSER[opened])
+            if not self.stack:
+                self.complete = True
+                return
+            if opened == "{":
+                self.nested_objects -= 1
+            self._value_done()
+            return
+
+        # A key or value starts here
+        if expecting == "comma":
+            # Missing comma between members / elements
+            self.pending_comma = True
+            expecting = frame[1] = "key" if opened == "{" else "value"
+        elif expecting == "colon":
+            # Missing colon after a key
+            out.append(":")
+            expecting = frame[1] = "value"
+        if self.pending_comma:
+            self.pending_comma = False
+            out.append(",")
+
+        if expecting == "key":
+            if ch != '"':
+                # Keys must be strings: keep what came before this one
+                self.broken = True
+                return
+            self.string_is_key = True
+            self.key_start = len(out)
+            out.append(ch)
+            self.in_string = True
+        elif ch == '"':
+            self.string_is_key = False
+            self._value_start()
+            out.append(ch)
+            self.in_string = True
+        elif ch in "{[":
+            self._value_start()
+            out.append(ch)
+            self.stack.append([ch, "key" if ch == "{" else "value"])
+            if ch == "{":
+                self.nested_objects += 1
+            else:
+                self._mark_safe()
+        else:
+            self._value_start()
+            self.scalar_start = len(out)
+            out.append(ch)
+            self.in_scalar = True
+
+    def _value_start(self):
+        if len(self.stack) == 2 and self.stack[-1][0] == "[" and self.root_key in self.watch:
+            self.item_start = len(self.out)
+
+    def _value_done(self):
+        self.stack[-1][1] = "comma"
+        depth = len(self.stack)
+        if depth == 1:
+            self.intact_keys.append(self.root_key)
+        elif depth == 2 and self.item_start is not None:
+            try:
+                item = json.loads("".join(self.out[self.item_start:]))
+                self._events.append((self.root_key, item))
+            except ValueError:
+                pass
+            self.item_start = None
+        self._mark_safe()
+
+    def _mark_safe(self):
+        # Only cut where no half-written object is open below the root,
+        # so partial trailing elements are dropped rather than kept
+        if self.nested_objects == 0:
+            self.safe_len = len(self.out)
+            self.safe_closers = "".join(_CLOSER[f[0]] for f in reversed(self.stack))
@@ -0,0 +1,219 @@
+import asyncio
+import hashlib
+import re
+import json
+import threading
+from dataclasses import dataclass
+
+
+@dataclass(slots=True)
+class LLMResponse:
+    text: str
+    prompt_tokens: int = 0
+    response_tokens: int = 0
+
+
+class LLMBackend:
+    """
+    Interface every LLM backend implements.
+    `agenerate` defaults to running `generate` on a worker thread.
+    `timeout` (seconds) is how long the caller will wait for the answer; a
+    backend that can should give up by then rather than keep a worker busy.
+    """
+
+    name = "base"
+
+    def generate(self, prompt, model, generation_config=None, timeout=None):
+        raise NotImplementedError
+
+    async def agenerate(self, prompt, model, generation_config=None, timeout=None):
+        return await asyncio.to_thread(self.generate, prompt, model, generation_config, timeout)
+
+    def stream(self, prompt, model, generation_config=None, usage=None):
+        """
+        Yield the response text in chunks as it is produced. If `usage` is
+        a dict it receives prompt_tokens / response_tokens once the stream ends.
+        """
+        response = self.generate(prompt, model, generation_config)
+        yield response.text
+        if usage is not None:
+            usage.update(prompt_tokens=response.prompt_tokens, response_tokens=response.response_tokens)
+
+
+class GeminiBackend(LLMBackend):
+    """
+    Google Gemini backend. The SDK is configured once and one GenerativeModel
+    is kept per model name for the life of the process.
+    """
+
+    name = "gemini"
+
+    def __init__(self, api_key):
+        self.api_key = api_key
+        self._genai = None
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def _model(self, model):
+        client = self._models.get(model)
+        if client is not None:
+            return client
+        with self._lock:
+            if self._genai is None:
+                import google.generativeai as genai
+                genai.configure(api_key=self.api_key)
+                self._genai = genai
+            if model not in self._models:
+                self._models[model] = self._genai.GenerativeModel(model)
+            return self._models[model]
+
+    @staticmethod
+    def _usage(response):
+        usage = getattr(response, "usage_metadata", None)
+        return {
+            "prompt_tokens": getattr(usage, "prompt_token_count", 0) or 0,
+            "response_tokens": getattr(usage, "candidates_token_count", 0) or 0,
+        }
+
+    @classmethod
+    def _to_response(cls, response):
+        return LLMResponse(text=response.text.strip(), **cls._usage(response))
+
+    @staticmethod
+    def _request_options(timeout):
+        return {"timeout": timeout} if timeout else None
+
+    def generate(self, prompt, model, generation_config=None, timeout=None):
+        response = self._model(model).generate_content(
+            prompt, generation_config=generation_config, request_options=self._request_options(timeout)
+        )
+        return self._to_response(response)
+
+    async def agenerate(self, prompt, model, generation_config=None, timeout=None):
+        response = await self._model(model).generate_content_async(
+            prompt, generation_config=generation_config, request_options=self._request_options(timeout)
+        )
+        return self._to_response(response)
+
+    def stream(self, prompt, model, generation_config=None, usage=None):
+        response = self._model(model).generate_content(
+            prompt, generation_config=generation_config, stream=True
+        )
+        for chunk in response:
+            text = getattr(chunk, "text", "")
+            if text:
+                yield text
+        # Usage metadata is only complete once the stream has been drained
+        if usage is not None:
+            usage.update(self._usage(response))
+
+
+class LocalBackend(LLMBackend):
+    """
+    Offline, deterministic stand-in for Gemini.
+
+    It reads the trip facts back out of the itinerary prompt (destination
+    line, duration, budget, travelers and the per-city day allocation) and
+    answers with a well-formed plan. The same prompt always yields the same
+    text, so it is suitable for load tests and running the pipeline without
+    network access.
+    """
+
+    name = "local"
+
+    ACTIVITIES = [
+        "Walking tour of the old town",
+        "Visit the main museum",
+        "Local food trail",
+        "Sunset viewpoint",
+        "Morning market visit",
+        "Boat ride",
+        "Heritage site visit",
+        "Evening cultural show",
+    ]
+
+    def generate(self, prompt, model, generation_config=None, timeout=None):
+        seed = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8], 16)
+        plan = self._itinerary(prompt, seed)
+        text = json.dumps(plan, ensure_ascii=False)
+        return LLMResponse(text=text, prompt_tokens=len(prompt) // 4, response_tokens=len(text) // 4)
+
+    def stream(self, prompt, model, generation_config=None, usage=None):
+        response = self.generate(prompt, model, generation_config)
+        text = response.text
+        for i in range(0, len(text), 64):
+            yield text[i:i + 64]
+        if usage is not None:
+            usage.update(prompt_tokens=response.prompt_tokens, response_tokens=response.response_tokens)
+
+    @staticmethod
+    def _number(prompt, key, default):
+        match = re.search(rf'"{key}":\s*(\d+)', prompt)
+        return int(match.group(1)) if match else default
+
+    def _itinerary(self, prompt, seed):
+        allocation = [
+            (city.strip(), int(days))
+            for city, days in re.findall(r"^- (.+?): (\d+) day\(s\)$", prompt, re.M)
+        ]
+        duration = self._number(prompt, "duration", sum(d for _, d in allocation) or 1)
+        budget = self._number(prompt, "total_budget", 0)
+        travelers = self._number(prompt, "travelers", 1)
+        if not allocation:
+            allocation = [("Unknown City", duration)]
+
+        match = re.search(r'"destination":\s*"([^"]*)"', prompt)
+        destination = match.group(1) if match else ", ".join(c for c, _ in allocation)
+
+        # Spend ~80% of the budget: 45% days, 40% stays, 15% transport
+        spend = budget * 0.8
+        per_day = int(spend * 0.45 / max(duration, 1))
+
+        days = []
+        for city, count in allocation:
+            for _ in range(count):
+                n = len(days) + 1
+                picks = [self.ACTIVITIES[(seed + n + k) % len(self.ACTIVITIES)] for k in range(3)]
+                days.append({
+                    "day": n,
+                    "city": city,
+                    "title": f"Exploring {city}",
+                    "activities": [f"{a} in {city}" for a in picks],
+                    "estimated_cost": per_day,
+                })
+
+        stays = [
+            {
+                "city": city,
+                "hotel": f"{city} Central Inn",
+                "type": "Mid-range Hotel",
+                "estimated_cost": int(spend * 0.40 * count / max(duration, 1)),
+            }
+            for city, count in allocation
+        ]
+
+        return {
+            "destination": destination,
+            "duration": duration,
+            "total_budget": budget,
+            "travelers": travelers,
+            "per_day_breakdown": days,
+            "city_accommodations": stays,
+            "accommodation": {
+                "type": "Mid-range Hotel",
+                "example": stays[0]["hotel"],
+                "estimated_cost": sum(s["estimated_cost"] for s in stays),
+            },
+            "transport": {
+                "recommended_transport": "Train and local taxis",
+                "estimated_cost": int(spend * 0.15),
+            },
+            "top_places": [f"{city} Old Town" for city, _ in allocation],
+            "summary": f"A {duration}-day trip covering {', '.join(c for c, _ in allocation)}.",
+        }
+
+
+BACKENDS = {
+    "gemini": GeminiBackend,
+    "local": LocalBackend,
+}
@@ -0,0 +1,268 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_prompt(prompt):
+    """
+    Normalize whitespace so cosmetic prompt differences share a cache entry:
+    trailing spaces are dropped, blank-line runs collapse to one.
+    """
+    lines = [line.rstrip() for line in prompt.strip().splitlines()]
+    out = []
+    for line in lines:
+        if not line and out and not out[-1]:
+            continue
+        out.append(line)
+    return "\n".join(out)
+
+
+def make_key(model, prompt, generation_config=None):
+    """
+    Content address for one LLM call: (model, normalized prompt, generation config).
+    """
+    payload = json.dumps(
+        {
+            "model": model,
+            "prompt": hashlib.sha256(normalize_prompt(prompt).encode("utf-8")).hexdigest(),
+            "config": generation_config or {},
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MemoryTier:
+    """
+    Bounded in-process LRU with per-entry expiry.
+    """
+
+    def __init__(self, max_items, ttl):
+        self.max_items = max_items
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self.evictions = 0
+
+    def get(self, key):
+        entry = self._items.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.time():
+            del self._items[key]
+            return None
+        self._items.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self._items[key] = (time.time() + self.ttl, value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_items:
+            self._items.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key):
+        self._items.pop(key, None)
+
+    def clear(self):
+        self._items.clear()
+
+
+class DiskTier:
+    """
+    One JSON file per entry under <directory>/<key[:2]>/<key>.json.
+    Entries older than `ttl` are treated as missing; when the tier grows past
+    `max_bytes`, the least recently used files are removed until it is back
+    under 90% of the limit.
+
+    Thread-safe without serializing I/O: files are written atomically (tmp +
+    replace), a running byte count (one walk, on first use) is the only
+    shared state under the lock, and one thread at a time evicts.
+    """
+
+    def __init__(self, directory, ttl, max_bytes):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self.expirations = 0
+        self._size = None
+        self._evicting = False
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _entries(self):
+        if not os.path.isdir(self.directory):
+            return
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".json"):
+                    path = os.path.join(root, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    yield path, st
+
+    def size(self):
+        if self._size is None:
+            total = sum(st.st_size for _, st in self._entries())
+            with self._lock:
+                if self._size is None:
+                    self._size = total
+        return self._size
+
+    def _adjust(self, delta):
+        with self._lock:
+            if self._size is not None:
+                self._size += delta
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if entry.get("created", 0) + self.ttl < time.time():
+            if self._remove(path):
+                with self._lock:
+                    self.expirations += 1
+            return None
+
+        # Touch so size-bounded eviction sees this entry as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry.get("value")
+
+    def set(self, key, value):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = json.dumps({"created": time.time(), "value": value}, ensure_ascii=False)
+
+        self.size()
+        try:
+            old = os.path.getsize(path)
+        except OSError:
+            old = 0
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+        with self._lock:
+            self._size += len(data.encode("utf-8")) - old
+            evict = self._size > self.max_bytes and not self._evicting
+            if evict:
+                self._evicting = True
+        if evict:
+            try:
+                self._evict()
+            finally:
+                self._evicting = False
+
+    def delete(self, key):
+        self._remove(self._path(key))
+
+    def clear(self):
+        for path, _ in list(self._entries()):
+            self._remove(path)
+
+    def _remove(self, path):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return False
+        self._adjust(-size)
+        return True
+
+    def _evict(self):
+        target = int(self.max_bytes * 0.9)
+        entries = sorted(self._entries(), key=lambda e: e[1].st_mtime)
+        for path, _ in entries:
+            if self._size <= target:
+                break
+            if self._remove(path):
+                with self._lock:
+                    self.evictions += 1
+
+
+class ResponseCache:
+    """
+    Two-tier cache for LLM responses: memory LRU in front of the disk tier.
+    Disk hits are promoted into memory. Safe to share between threads: the
+    lock covers the memory tier and counters only, so disk reads and writes
+    from concurrent callers overlap.
+    """
+
+    def __init__(self, directory, ttl=86400, max_bytes=256 * 1024 * 1024, max_items=256):
+        self.memory = MemoryTier(max_items, ttl)
+        self.disk = DiskTier(directory, ttl, max_bytes) if directory else None
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self.memory.get(key)
+            if value is not None:
+                self.hits_memory += 1
+                return value
+
+        if self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                with self._lock:
+                    self.hits_disk += 1
+                    self.memory.set(key, value)
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, value):
+        with self._lock:
+            self.memory.set(key, value)
+        if self.disk is not None:
+            try:
+                self.disk.set(key, value)
+            except OSError:
+                # A read-only or full disk should never fail the request
+                pass
+
+    def delete(self, key):
+        with self._lock:
+            self.memory.delete(key)
+        if self.disk is not None:
+            self.disk.delete(key)
+
+    def clear(self):
+        with self._lock:
+            self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self):
+        disk_bytes = self.disk.size() if self.disk else 0
+        with self._lock:
+            return {
+                "hits_memory": self.hits_memory,
+                "hits_disk": self.hits_disk,
+                "misses": self.misses,
+                "evictions_memory": self.memory.evictions,
+                "evictions_disk": self.disk.evictions if self.disk else 0,
+                "expirations_disk": self.disk.expirations if self.disk else 0,
+                "disk_bytes": disk_bytes,
+            }
@@ -0,0 +1,159 @@
+import contextvars
+import threading
+from contextlib import contextmanager
+
+from config import (
+    DEFAULT_MODEL,
+    MODEL_TIERS,
+    CASCADE_SMALL_DAYS,
+    CASCADE_MAX_FAILURE_RATE,
+    CASCADE_MIN_SAMPLES,
+)
+from utils.tracing import METRICS
+
+# Model for LLM calls made in this context (None → DEFAULT_MODEL); copied
+# into pool threads by tracing.propagate like the current trace
+_model = contextvars.ContextVar("atlas_model", default=None)
+
+# Weight of the newest sample in the moving averages
+EWMA_ALPHA = 0.2
+
+# An unhealthy tier still gets every Nth request it would have had, so its
+# stats can recover
+PROBE_EVERY = 20
+
+
+def current_model():
+    return _model.get() or DEFAULT_MODEL
+
+
+@contextmanager
+def use_model(model):
+    """
+    Route the LLM calls made inside the block to `model`.
+    """
+    token = _model.set(model)
+    try:
+        yield
+    finally:
+        _model.reset(token)
+
+
+class ModelStats:
+    """
+    Moving averages of one model's call latency and failure rate
+    (failed calls and drafts that failed validation both count).
+    """
+
+    __slots__ = ("latency_s", "failure_rate", "samples")
+
+    def __init__(self):
+        self.latency_s = None
+        self.failure_rate = 0.0
+        self.samples = 0
+
+    def add(self, failed, latency_s=None):
+        self.samples += 1
+        self.failure_rate += EWMA_ALPHA * (float(failed) - self.failure_rate)
+        if latency_s is not None:
+            self.latency_s = latency_s if self.latency_s is None else \
+                self.latency_s + EWMA_ALPHA * (latency_s - self.latency_s)
+
+    def to_dict(self):
+        return {
+            "latency_s": round(self.latency_s, 3) if self.latency_s is not None else None,
+            "failure_rate": round(self.failure_rate, 3),
+            "samples": self.samples,
+        }
+
+
+class ModelRouter:
+    """
+    Tiered model cascade, cheapest / fastest tier first.
+
+    Small trips (at most `small_days` days, one city) start on tier 0,
+    everything else on tier 1; each refinement loop after a failed
+    validation escalates one tier. From that starting tier, a tier is
+    skipped while it is unhealthy: failing more often than
+    `max_failure_rate`, or currently slower than the tier above it (a
+    cheap tier that is not faster buys nothing). The strongest tier is
+    never skipped, and a skipped tier is probed every PROBE_EVERY picks.
+    With a single tier every call uses it.
+    """
+
+    def __init__(self, tiers, small_days=CASCADE_SMALL_DAYS,
+                 max_failure_rate=CASCADE_MAX_FAILURE_RATE, min_samples=CASCADE_MIN_SAMPLES):
+        self.tiers = list(tiers) or [DEFAULT_MODEL]
+        self.small_days = small_days
+        self.max_failure_rate = max_failure_rate
+        self.min_samples = min_samples
+        self.stats = {model: ModelStats() for model in self.tiers}
+        self.skips = {model: 0 for model in self.tiers}
+        self._lock = threading.Lock()
+
+    def base_tier(self, user_input):
+        destinations = user_input.get("destinations") or []
+        small = len(destinations) <= 1 and int(user_input.get("duration") or 1) <= self.small_days
+        return 0 if small else min(1, len(self.tiers) - 1)
+
+    def _unhealthy(self, tier):
+        stats = self.stats[self.tiers[tier]]
+        if stats.samples < self.min_samples:
+            return False
+        if stats.failure_rate > self.max_failure_rate:
+            return True
+        above = self.stats[self.tiers[tier + 1]]
+        return above.latency_s is not None and stats.latency_s is not None \
+            and above.samples >= self.min_samples and stats.latency_s > above.latency_s
+
+    def pick(self, user_input, loop=0):
+        """
+        Tier index for refinement loop `loop` of this trip.
+        """
+        last = len(self.tiers) - 1
+        tier = min(self.base_tier(user_input) + loop, last)
+        with self._lock:
+            while tier < last and self._unhealthy(tier):
+                model = self.tiers[tier]
+                self.skips[model] += 1
+                if self.skips[model] >= PROBE_EVERY:
+                    self.skips[model] = 0
+                    METRICS.inc("atlas_model_probes_total", {"model": model})
+                    break
+                tier += 1
+        return tier
+
+    def record_call(self, model, latency_s, ok):
+        stats = self.stats.get(model)
+        if stats is None:
+            return
+        with self._lock:
+            stats.add(not ok, latency_s)
+
+    def record_draft(self, model, valid):
+        stats = self.stats.get(model)
+        if stats is None:
+            return
+        with self._lock:
+            stats.add(not valid)
+        METRICS.inc("atlas_model_drafts_total", {"model": model, "valid": str(bool(valid)).lower()})
+
+    def snapshot(self):
+        with self._lock:
+            return {model: self.stats[model].to_dict() for model in self.tiers}
+
+
+_router = None
+_lock = threading.Lock()
+
+
+def get_router():
+    """
+    Process-wide model router over config.MODEL_TIERS, built on first use.
+    """
+    global _router
+    if _router is None:
+        with _lock:
+            if _router is None:
+                _router = ModelRouter(MODEL_TIERS)
+    return _router
@@ -0,0 +1,38 @@
+import json
+
+
+def normalize_payload(payload):
+    """
+    Canonical form of a planner payload: trimmed strings, destinations as
+    a list, numbers as ints where they parse. Unknown keys (e.g. "id")
+    are dropped. Two payloads that plan the same trip normalize equal up
+    to letter case, which `payload_key` ignores.
+    """
+    destinations = payload.get("destinations", [])
+    if isinstance(destinations, str):
+        destinations = destinations.split(",")
+    if not isinstance(destinations, (list, tuple)):
+        destinations = []
+
+    normalized = {
+        "source": " ".join(str(payload.get("source") or "").split()),
+        "destinations": [" ".join(str(d).split()) for d in destinations if str(d).strip()],
+    }
+    for field in ("duration", "budget", "travelers"):
+        value = payload.get(field)
+        try:
+            normalized[field] = int(value)
+        except (TypeError, ValueError):
+            normalized[field] = value
+    return normalized
+
+
+def payload_key(payload):
+    """
+    Case-insensitive identity of a normalized payload, for coalescing
+    concurrent requests for the same trip.
+    """
+    folded = dict(payload)
+    folded["source"] = folded["source"].casefold()
+    folded["destinations"] = [d.casefold() for d in folded["destinations"]]
+    return json.dumps(folded, sort_keys=True, ensure_ascii=False)
@@ -3,24 +3,86 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
 from reportlab.lib.units import inch
 from reportlab.lib import colors
-import tempfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import io
+import json
+import threading
+
+# Styles are immutable once built — share them across renders
+styles = getSampleStyleSheet()
+normal = styles["Normal"]
+title_style = ParagraphStyle(
+    'TitleStyle',
+    parent=styles['Heading1'],
+    fontSize=20,
+    textColor=colors.HexColor("#1a73e8"),
+    alignment=1,
+    spaceAfter=20,
+)
+
+# Rendered PDFs keyed by itinerary content hash
+PDF_CACHE_SIZE = 64
+_pdf_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def itinerary_hash(itinerary):
+    data = json.dumps(itinerary, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def _cache_put(key, pdf):
+    with _cache_lock:
+        _pdf_cache[key] = pdf
+        _pdf_cache.move_to_end(key)
+        while len(_pdf_cache) > PDF_CACHE_SIZE:
+            _pdf_cache.popitem(last=False)
+
 
 def generate_pdf(itinerary):
-    # --- PDF File in Temp Directory ---
-    temp = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
-    pdf_path = temp.name
-
-    doc = SimpleDocTemplate(pdf_path, pagesize=A4)
-    styles = getSampleStyleSheet()
-    normal = styles["Normal"]
-    title_style = ParagraphStyle(
-        'TitleStyle',
-        parent=styles['Heading1'],
-        fontSize=20,
-        textColor=colors.HexColor("#1a73e8"),
-        alignment=1,
-        spaceAfter=20,
-    )
+    """
+    Render an itinerary to PDF bytes (in memory, nothing written to disk).
+    Repeated renders of the same content are served from the cache.
+    """
+    key = itinerary_hash(itinerary)
+    with _cache_lock:
+        pdf = _pdf_cache.get(key)
+        if pdf is not None:
+            _pdf_cache.move_to_end(key)
+            return pdf
+
+    pdf = render_pdf(itinerary)
+    _cache_put(key, pdf)
+    return pdf
+
+
+def generate_pdf_batch(itineraries, max_workers=None):
+    """
+    Render many itineraries across a process pool (catalogue export).
+    Returns PDF bytes in input order; cached ones are not re-rendered.
+    """
+    keys = [itinerary_hash(it) for it in itineraries]
+    with _cache_lock:
+        results = [_pdf_cache.get(k) for k in keys]
+
+    missing = [i for i, pdf in enumerate(results) if pdf is None]
+    if missing:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            rendered = pool.map(render_pdf, [itineraries[i] for i in missing], chunksize=4)
+            for i, pdf in zip(missing, rendered):
+                results[i] = pdf
+                _cache_put(keys[i], pdf)
+    return results
+
+
+def render_pdf(itinerary):
+    """
+    Build the PDF for one itinerary into a memory buffer and return its bytes.
+    """
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4)
 
     story = []
 
@@ -87,4 +149,4 @@ def generate_pdf(itinerary):
 
     # ---- BUILD PDF ----
     doc.build(story)
-    return pdf_path
+    return buffer.getvalue()
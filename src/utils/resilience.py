@@ -0,0 +1,234 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from tenacity import (
+    AsyncRetrying,
+    Retrying,
+    retry_if_exception,
+    stop_after_attempt,
+    wait_random_exponential,
+)
+
+# Error class names treated as transient (google.api_core + stdlib)
+RETRYABLE_ERRORS = {
+    "ResourceExhausted",      # 429
+    "TooManyRequests",
+    "ServiceUnavailable",     # 503
+    "InternalServerError",    # 500
+    "DeadlineExceeded",
+    "GatewayTimeout",
+    "TimeoutError",
+    "ConnectionError",
+    "ConnectionResetError",
+}
+
+
+def is_retryable(exc):
+    return any(cls.__name__ in RETRYABLE_ERRORS for cls in type(exc).__mro__)
+
+
+class TokenBucket:
+    """
+    Token-bucket rate limiter shared by threads and asyncio tasks.
+
+    Callers reserve a token up front (the balance may go negative) and then
+    sleep off the debt, so waiting happens outside the lock and callers are
+    served in arrival order.
+    """
+
+    def __init__(self, rate_per_s, burst):
+        self.rate = rate_per_s
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            self.throttled += 1
+            return -self.tokens / self.rate
+
+    def try_acquire(self):
+        """
+        Take a token only if one is available right now.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+    def acquire(self):
+        delay = self._reserve()
+        if delay:
+            time.sleep(delay)
+
+    async def aacquire(self):
+        delay = self._reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+class ResilientCaller:
+    """
+    Wraps backend calls with rate limiting, per-attempt deadlines, retries
+    with jittered exponential backoff and optional hedging.
+
+    Hedging: if an attempt is still running after the observed p95 latency
+    (or `hedge_after` until enough samples exist), a duplicate request is
+    sent when the limiter has a spare token, and the first answer wins.
+
+    Backend calls are passed the seconds left until the attempt's deadline
+    and are expected to give up by then, so calls abandoned at the deadline
+    do not pile up in the worker pool behind a stalled backend.
+    """
+
+    def __init__(self, limiter, timeout, max_retries, backoff_base, backoff_max,
+                 hedge=False, hedge_after=8.0, max_workers=32):
+        self.limiter = limiter
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_after = hedge_after
+        self.latencies = deque(maxlen=200)
+        self.counters = {"calls": 0, "retries": 0, "timeouts": 0, "hedges_sent": 0, "hedges_won": 0}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm")
+
+    # ---- bookkeeping ----
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _record(self, seconds):
+        with self._lock:
+            self.latencies.append(seconds)
+
+    def hedge_threshold(self):
+        with self._lock:
+            if len(self.latencies) < 20:
+                return self.hedge_after
+            ordered = sorted(self.latencies)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        stats["throttles"] = self.limiter.throttled
+        return stats
+
+    def _retry_policy(self):
+        return dict(
+            stop=stop_after_attempt(self.max_retries + 1),
+            wait=wait_random_exponential(multiplier=self.backoff_base, max=self.backoff_max),
+            retry=retry_if_exception(is_retryable),
+            before_sleep=lambda _: self._count("retries"),
+            reraise=True,
+        )
+
+    # ---- sync ----
+    def call(self, fn):
+        """
+        Run `fn(timeout)` (a blocking backend call that gives up after
+        `timeout` seconds) under the full policy.
+        """
+        self._count("calls")
+        for attempt in Retrying(**self._retry_policy()):
+            with attempt:
+                return self._attempt(fn)
+
+    def _attempt(self, fn):
+        self.limiter.acquire()
+        start = time.monotonic()
+        deadline = start + self.timeout
+        primary = self._pool.submit(fn, self.timeout)
+        pending = {primary}
+
+        if self.hedge:
+            done, _ = wait(pending, timeout=min(self.hedge_threshold(), self.timeout))
+            if not done and self.limiter.try_acquire():
+                pending.add(self._pool.submit(fn, max(deadline - time.monotonic(), 0.001)))
+                self._count("hedges_sent")
+
+        error = None
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    self._record(time.monotonic() - start)
+                    if future is not primary:
+                        self._count("hedges_won")
+                    return future.result()
+                error = future.exception()
+
+        if error is not None and not pending:
+            raise error
+        self._count("timeouts")
+        raise TimeoutError(f"LLM call exceeded {self.timeout}s deadline")
+
+    # ---- async ----
+    async def acall(self, make_coro):
+        """
+        Async counterpart of call: `make_coro(timeout)` must return a fresh
+        coroutine.
+        """
+        self._count("calls")
+        async for attempt in AsyncRetrying(**self._retry_policy()):
+            with attempt:
+                return await self._aattempt(make_coro)
+
+    async def _aattempt(self, make_coro):
+        await self.limiter.aacquire()
+        start = time.monotonic()
+        deadline = start + self.timeout
+        primary = asyncio.ensure_future(make_coro(self.timeout))
+        pending = {primary}
+
+        try:
+            if self.hedge:
+                done, _ = await asyncio.wait(pending, timeout=min(self.hedge_threshold(), self.timeout))
+                if not done and self.limiter.try_acquire():
+                    pending.add(asyncio.ensure_future(make_coro(max(deadline - time.monotonic(), 0.001))))
+                    self._count("hedges_sent")
+
+            error = None
+            while pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(
+                    pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        self._record(time.monotonic() - start)
+                        if task is not primary:
+                            self._count("hedges_won")
+                        return task.result()
+                    error = task.exception()
+
+            if error is not None and not pending:
+                raise error
+            self._count("timeouts")
+            raise TimeoutError(f"LLM call exceeded {self.timeout}s deadline")
+        finally:
+            for task in pending:
+                task.cancel()
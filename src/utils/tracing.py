@@ -0,0 +1,212 @@
+import contextvars
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# Set ATLAS_PROFILE=1 to attach a cProfile summary to every trace
+PROFILE_ENABLED = os.getenv("ATLAS_PROFILE", "0") == "1"
+
+# Latency histogram buckets (milliseconds)
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+_current = contextvars.ContextVar("atlas_trace", default=None)
+
+
+class Trace:
+    """
+    Per-request record of timed spans plus request-level attributes
+    (refinement loops, token counts, failure reason, ...).
+    `on_span(name, attrs)`, if set, is called as each span starts (from
+    whichever thread opens it), e.g. to report progress.
+    """
+
+    def __init__(self, on_span=None):
+        self.on_span = on_span
+        self.trace_id = uuid.uuid4().hex[:12]
+        self.started = time.time()
+        self.duration_ms = None
+        self.spans = []
+        self.attrs = {}
+        self.profile = None
+        self._lock = threading.Lock()
+
+    def add_span(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def set(self, **attrs):
+        with self._lock:
+            self.attrs.update(attrs)
+
+    def incr(self, key, value=1):
+        with self._lock:
+            self.attrs[key] = self.attrs.get(key, 0) + value
+
+    def to_dict(self):
+        with self._lock:
+            data = {
+                "trace_id": self.trace_id,
+                "started": self.started,
+                "duration_ms": self.duration_ms,
+                "attrs": dict(self.attrs),
+                "spans": list(self.spans),
+            }
+        if self.profile:
+            data["profile"] = self.profile
+        return data
+
+
+class Metrics:
+    """
+    Process-wide counters and latency histograms, keyed by name + labels.
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((labels or {}).items()))
+
+    def inc(self, name, labels=None, value=1):
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value_ms, labels=None):
+        key = self._key(name, labels)
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = {"buckets": [0] * len(BUCKETS_MS), "count": 0, "sum": 0.0}
+            for i, bound in enumerate(BUCKETS_MS):
+                if value_ms <= bound:
+                    hist["buckets"][i] += 1
+            hist["count"] += 1
+            hist["sum"] += value_ms
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def export_json(self):
+        with self._lock:
+            return {
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self.counters.items())
+                ],
+                "histograms": [
+                    {
+                        "name": name,
+                        "labels": dict(labels),
+                        "buckets_ms": dict(zip(BUCKETS_MS, hist["buckets"])),
+                        "count": hist["count"],
+                        "sum_ms": round(hist["sum"], 3),
+                    }
+                    for (name, labels), hist in sorted(self.histograms.items())
+                ],
+            }
+
+    def export_prometheus(self):
+        def fmt(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+        lines = []
+        with self._lock:
+            seen = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                if name not in seen:
+                    lines.append(f"# TYPE {name} counter")
+                    seen.add(name)
+                lines.append(f"{name}{fmt(labels)} {value}")
+            for (name, labels), hist in sorted(self.histograms.items()):
+                if name not in seen:
+                    lines.append(f"# TYPE {name} histogram")
+                    seen.add(name)
+                for bound, count in zip(BUCKETS_MS, hist["buckets"]):
+                    lines.append(f"{name}_bucket{fmt(labels, [('le', bound)])} {count}")
+                lines.append(f"{name}_bucket{fmt(labels, [('le', '+Inf')])} {hist['count']}")
+                lines.append(f"{name}_sum{fmt(labels)} {round(hist['sum'], 3)}")
+                lines.append(f"{name}_count{fmt(labels)} {hist['count']}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+
+
+def current_trace():
+    return _current.get()
+
+
+@contextmanager
+def trace(on_span=None):
+    """
+    Start a request trace; spans opened inside (on this thread or on threads
+    started via `propagate`) are attached to it.
+    """
+    tr = Trace(on_span)
+    token = _current.set(tr)
+    profiler = cProfile.Profile() if PROFILE_ENABLED else None
+    start = time.perf_counter()
+    if profiler:
+        profiler.enable()
+    try:
+        yield tr
+    finally:
+        if profiler:
+            profiler.disable()
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(25)
+            tr.profile = out.getvalue()
+        tr.duration_ms = round((time.perf_counter() - start) * 1000, 3)
+        METRICS.observe("atlas_request_latency_ms", tr.duration_ms)
+        _current.reset(token)
+
+
+@contextmanager
+def span(name, **attrs):
+    """
+    Time a block. Always feeds the `atlas_span_latency_ms{span=...}`
+    histogram; also recorded on the current trace if there is one.
+    Yields a dict the block can add attributes to.
+    """
+    record = {"name": name, "attrs": dict(attrs)}
+    tr = _current.get()
+    if tr is not None and tr.on_span is not None:
+        tr.on_span(name, record["attrs"])
+    start = time.perf_counter()
+    offset = time.time()
+    try:
+        yield record["attrs"]
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+        METRICS.inc("atlas_span_errors_total", {"span": name})
+        raise
+    finally:
+        record["duration_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        METRICS.observe("atlas_span_latency_ms", record["duration_ms"], {"span": name})
+        if tr is not None:
+            record["offset_ms"] = round((offset - tr.started) * 1000, 3)
+            tr.add_span(record)
+
+
+def propagate(fn):
+    """
+    Wrap `fn` so it runs in a copy of the caller's context (thread pools
+    do not inherit the current trace on their own).
+    """
+    ctx = contextvars.copy_context()
+    return lambda *args, **kwargs: ctx.run(fn, *args, **kwargs)
+
@@ -0,0 +1,368 @@
+import json
+import os
+import threading
+import time
+import uuid
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from agents.budget_agent import optimize_budget
+from agents.validation_agent import infer_trip_region
+from config import TRIP_STORE_DIR
+from itinerary import Itinerary
+from utils.fragment_store import budget_tier
+from utils.payloads import normalize_payload
+from utils.tracing import METRICS, current_trace
+
+# One row per stored trip; the full plan is kept as JSON for serving
+TRIPS = pa.schema([
+    ("trip_id", pa.string()),
+    ("created", pa.float64()),
+    ("source", pa.string()),
+    ("destinations", pa.list_(pa.string())),
+    ("destination_key", pa.string()),
+    ("region", pa.string()),
+    ("duration", pa.int32()),
+    ("budget", pa.int64()),
+    ("budget_tier", pa.int8()),
+    ("travelers", pa.int32()),
+    ("total_cost", pa.int64()),
+    ("plan", pa.string()),
+])
+
+# Flattened per-day and per-accommodation rows, for bulk scans
+DAYS = pa.schema([
+    ("trip_id", pa.string()),
+    ("day", pa.int32()),
+    ("city", pa.string()),
+    ("title", pa.string()),
+    ("activities", pa.list_(pa.string())),
+    ("estimated_cost", pa.int64()),
+])
+
+STAYS = pa.schema([
+    ("trip_id", pa.string()),
+    ("city", pa.string()),
+    ("hotel", pa.string()),
+    ("type", pa.string()),
+    ("estimated_cost", pa.int64()),
+])
+
+TABLES = {"trips": TRIPS, "days": DAYS, "stays": STAYS}
+
+# Columns the lookup index is built from (everything but the plan JSON)
+_INDEX_COLUMNS = ["trip_id", "created", "source", "destination_key", "duration",
+                  "budget", "budget_tier", "travelers"]
+
+
+def destination_key(destinations):
+    """
+    Order-insensitive, case-insensitive identity of a destination set.
+    """
+    return "|".join(sorted(d.strip().casefold() for d in destinations))
+
+
+def trip_key(payload):
+    """
+    Index key of a normalized payload: (source, destination set, duration,
+    budget tier, travelers). The source is part of it because the stored
+    transport leg only fits the same starting city.
+    """
+    duration = payload["duration"]
+    travelers = payload["travelers"]
+    return (
+        payload["source"].casefold(),
+        destination_key(payload["destinations"]),
+        duration,
+        budget_tier(payload["budget"], duration, travelers),
+        travelers,
+    )
+
+
+def _cost(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and value == value:
+        return int(value)
+    return None
+
+
+def _text(value):
+    return value if isinstance(value, str) else None
+
+
+class TripStore:
+    """
+    Append-only Parquet library of accepted plans under `root`:
+
+        trips/part-*.parquet  one row per trip (request fields + plan JSON)
+        days/part-*.parquet   one row per day of every trip
+        stays/part-*.parquet  one row per accommodation of every trip
+
+    Each append writes one new part per table (trips last, so a trip is
+    only visible once its days and stays are on disk). `compact` merges a
+    table's parts into a compact-*.parquet file that names the parts it
+    replaces; readers skip replaced parts, so a table reads the same before,
+    during and after compaction, whatever else is appending. `lookup` serves a
+    stored plan that fits a request through an in-memory index on
+    trip_key, rebuilt from the trips columns when new parts appear;
+    `scan` and the aggregates read whole tables for analytics.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        for table in TABLES:
+            os.makedirs(os.path.join(root, table), exist_ok=True)
+        self._index = {}
+        self._indexed_parts = None
+        self._replaces = {}
+        self._lock = threading.Lock()
+
+    def _dir(self, table):
+        return os.path.join(self.root, table)
+
+    def _parts(self, table):
+        """
+        The table's live files: every part not replaced by a compacted file.
+        """
+        return self._files(table)[0]
+
+    def _files(self, table):
+        # (live files, replaced files still on disk)
+        names = sorted(f for f in os.listdir(self._dir(table)) if f.endswith(".parquet"))
+        replaced = set()
+        for name in names:
+            if name.startswith("compact-"):
+                replaced.update(self._replaced_by(table, name))
+        return [n for n in names if n not in replaced], [n for n in names if n in replaced]
+
+    def _replaced_by(self, table, name):
+        # Files are immutable once in place, so this is read once per file
+        key = (table, name)
+        if key not in self._replaces:
+            metadata = pq.read_schema(os.path.join(self._dir(table), name)).metadata or {}
+            self._replaces[key] = json.loads(metadata.get(b"atlas.replaces", b"[]"))
+        return self._replaces[key]
+
+    # ---- writes ----
+    def append(self, trips):
+        """
+        Store [(payload, plan), ...] in one write; plans with an "error"
+        are skipped. Returns the new trip IDs.
+        """
+        rows = {table: [] for table in TABLES}
+        now = time.time()
+        ids = []
+        for payload, plan in trips:
+            if not isinstance(plan, dict) or "error" in plan:
+                continue
+            payload = normalize_payload(payload)
+            trip_id = uuid.uuid4().hex[:16]
+            ids.append(trip_id)
+            rows["trips"].append(self._trip_row(trip_id, now, payload, plan))
+            for day in plan.get("per_day_breakdown") or []:
+                if isinstance(day, dict):
+                    rows["days"].append({
+                        "trip_id": trip_id,
+                        "day": day.get("day") if isinstance(day.get("day"), int) else None,
+                        "city": _text(day.get("city")),
+                        "title": _text(day.get("title")),
+                        "activities": [str(a) for a in day.get("activities") or []],
+                        "estimated_cost": _cost(day.get("estimated_cost")),
+                    })
+            stays = plan.get("city_accommodations")
+            if not isinstance(stays, list):
+                stays = [plan["accommodation"]] if isinstance(plan.get("accommodation"), dict) else []
+            for stay in stays:
+                if isinstance(stay, dict):
+                    rows["stays"].append({
+                        "trip_id": trip_id,
+                        "city": _text(stay.get("city")),
+                        "hotel": _text(stay.get("hotel") or stay.get("example")),
+                        "type": _text(stay.get("type")),
+                        "estimated_cost": _cost(stay.get("estimated_cost")),
+                    })
+        if not ids:
+            return ids
+
+        part = f"part-{int(now * 1000):013d}-{uuid.uuid4().hex[:8]}.parquet"
+        for table in ("days", "stays", "trips"):
+            path = os.path.join(self._dir(table), part)
+            pq.write_table(pa.Table.from_pylist(rows[table], schema=TABLES[table]), path + ".tmp")
+            os.replace(path + ".tmp", path)
+        METRICS.inc("atlas_trip_store_writes_total", value=len(ids))
+        return ids
+
+    @staticmethod
+    def _trip_row(trip_id, now, payload, plan):
+        duration = payload["duration"]
+        travelers = payload["travelers"]
+        return {
+            "trip_id": trip_id,
+            "created": now,
+            "source": payload["source"],
+            "destinations": payload["destinations"],
+            "destination_key": destination_key(payload["destinations"]),
+            "region": infer_trip_region(payload["destinations"]),
+            "duration": duration,
+            "budget": payload["budget"],
+            "budget_tier": budget_tier(payload["budget"], duration, travelers),
+            "travelers": travelers,
+            "total_cost": int(Itinerary.from_dict(plan).total),
+            "plan": json.dumps(plan, ensure_ascii=False),
+        }
+
+    # ---- lookup ----
+    def _refresh_index(self):
+        parts = self._parts("trips")
+        with self._lock:
+            indexed = self._indexed_parts
+            if parts == indexed:
+                return self._index
+            if indexed is not None and set(indexed) <= set(parts):
+                # Only appends since the last refresh: index the new parts
+                index, new = self._index, sorted(set(parts) - set(indexed))
+            else:
+                index, new = {}, parts
+            for part in new:
+                table = pq.read_table(os.path.join(self._dir("trips"), part), columns=_INDEX_COLUMNS)
+                for row in table.to_pylist():
+                    key = (row["source"].casefold(), row["destination_key"], row["duration"],
+                           row["budget_tier"], row["travelers"])
+                    index.setdefault(key, []).append((row["trip_id"], row["budget"], row["created"], part))
+            self._index = index
+            self._indexed_parts = parts
+            return index
+
+    def lookup(self, payload):
+        """
+        A stored plan that fits this request (same source, destination set,
+        duration, budget tier and travelers), rebalanced to its budget; or
+        None. Among fits, the closest stored budget wins, then the newest.
+        """
+        payload = normalize_payload(payload)
+        candidates = self._refresh_index().get(trip_key(payload))
+        hit = bool(candidates)
+        METRICS.inc("atlas_trip_store_lookups_total", {"result": "hit" if hit else "miss"})
+        tr = current_trace()
+        if tr is not None:
+            tr.incr("trip_store_hits" if hit else "trip_store_misses")
+        if not hit:
+            return None
+
+        budget = payload["budget"]
+        trip_id, _, _, part = min(candidates, key=lambda c: (abs(c[1] - budget), -c[2]))
+        try:
+            table = pq.read_table(os.path.join(self._dir("trips"), part), columns=["plan"],
+                                  filters=[("trip_id", "==", trip_id)])
+        except FileNotFoundError:
+            # Compacted away since the index was built: re-index and retry
+            with self._lock:
+                self._indexed_parts = None
+            return self.lookup(payload)
+        plan = json.loads(table.column("plan")[0].as_py())
+        plan["total_budget"] = budget
+        return optimize_budget(plan, budget, payload)
+
+    # ---- analytics ----
+    def scan(self, table, columns=None, filter=None):
+        """
+        Read a whole table ("trips", "days" or "stays") as a pyarrow.Table,
+        optionally projected and filtered (a pyarrow.compute expression).
+        """
+        return self._dataset(table, self._parts(table)).to_table(columns=columns, filter=filter)
+
+    def _dataset(self, table, parts):
+        paths = [os.path.join(self._dir(table), part) for part in parts]
+        return ds.dataset(paths, format="parquet", schema=TABLES[table])
+
+    def cost_per_day_by_city(self):
+        """
+        Per-traveler daily spend by city across every stored day:
+        city, days, mean, approximate median and minimum (INR).
+        """
+        days = self.scan("days", ["trip_id", "city", "estimated_cost"],
+                         filter=ds.field("estimated_cost").is_valid() & ds.field("city").is_valid())
+        trips = self.scan("trips", ["trip_id", "travelers"])
+        joined = days.join(trips, "trip_id")
+        per_head = pc.divide(joined["estimated_cost"].cast(pa.float64()),
+                                     joined["travelers"].cast(pa.float64()))
+        table = pa.table({"city": pc.utf8_lower(joined["city"]), "cost": per_head})
+        return _summary(table, "city")
+
+    def daily_spend_by_region(self):
+        """
+        Whole-trip spend per traveler per day by trip region (domestic /
+        asia / long_haul): what validation_agent.REGION_PER_DAY_MIN
+        estimates.
+        """
+        trips = self.scan("trips", ["region", "duration", "travelers", "total_cost"])
+        per_head_day = pc.divide(
+            trips["total_cost"].cast(pa.float64()),
+            pc.multiply(trips["duration"], trips["travelers"]).cast(pa.float64()),
+        )
+        return _summary(pa.table({"region": trips["region"], "cost": per_head_day}), "region")
+
+    def stats(self):
+        counts = {}
+        for table in TABLES:
+            parts = self._parts(table)
+            counts[table] = sum(pq.ParquetFile(os.path.join(self._dir(table), p)).metadata.num_rows
+                                for p in parts)
+            counts[f"{table}_parts"] = len(parts)
+        return counts
+
+    def compact(self):
+        """
+        Merge each table's live files into one (rows are kept as they are).
+        Exactly the files listed up front are merged; parts appended
+        meanwhile stay live next to the compacted file.
+        """
+        with self._lock:
+            name = f"compact-{int(time.time() * 1000):013d}-{uuid.uuid4().hex[:8]}.parquet"
+            for table in ("days", "stays", "trips"):
+                old, leftover = self._files(table)
+                if len(old) < 2:
+                    continue
+                # Parts an interrupted compaction left behind are listed too,
+                # so they stay replaced once the file replacing them is gone
+                merged = self._dataset(table, old).to_table()
+                merged = merged.replace_schema_metadata({"atlas.replaces": json.dumps(old + leftover)})
+                path = os.path.join(self._dir(table), name)
+                pq.write_table(merged, path + ".tmp")
+                os.replace(path + ".tmp", path)
+                for part in old + leftover:
+                    try:
+                        os.remove(os.path.join(self._dir(table), part))
+                    except FileNotFoundError:
+                        pass
+            self._indexed_parts = None
+
+
+def _summary(table, by):
+    result = table.group_by(by).aggregate([
+        ("cost", "count"), ("cost", "mean"), ("cost", "approximate_median"), ("cost", "min"),
+    ])
+    return result.rename_columns({
+        "cost_count": "days" if by == "city" else "trips",
+        "cost_mean": "mean",
+        "cost_approximate_median": "median",
+        "cost_min": "min",
+    }).select([by, "days" if by == "city" else "trips", "mean", "median", "min"]).sort_by(by)
+
+
+_store = None
+_lock = threading.Lock()
+
+
+def get_trip_store():
+    """
+    Process-wide trip library under config.TRIP_STORE_DIR, built on first use.
+    """
+    global _store
+    if _store is None:
+        with _lock:
+            if _store is None:
+                _store = TripStore(TRIP_STORE_DIR)
+    return _store
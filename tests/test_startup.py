@@ -0,0 +1,37 @@
+"""
+Cold start of the Streamlit app: running src/app.py in a fresh interpreter
+must not load the planner or the heavy optional dependencies (they are
+imported where they are first used). The timing budget is machine-dependent
+and left to `python -m benchmarks.run --only startup`.
+"""
+import json
+import os
+import subprocess
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+DEFERRED = ("planner_core", "google.generativeai", "pyarrow", "reportlab", "numpy")
+
+# Renders the first page the way `streamlit run` would (AppTest runs the
+# script in-process, so sys.modules shows what it loaded)
+_PROBE = """
+import json, sys
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file(sys.argv[1], default_timeout=30).run()
+assert not at.exception, at.exception
+print(json.dumps({"loaded": [m for m in sys.argv[2:] if m in sys.modules]}))
+"""
+
+
+def _cold_start(tmp_path):
+    proc = subprocess.run(
+        [sys.executable, "-c", _PROBE, os.path.join(SRC, "app.py"), *DEFERRED],
+        capture_output=True, text=True, cwd=tmp_path,
+        env=dict(os.environ, PYTHONPATH=SRC, ATLAS_JOB_DB=str(tmp_path / "jobs.sqlite")),
+    )
+    assert proc.returncode == 0, proc.stderr
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def test_app_defers_heavy_imports(tmp_path):
+    assert _cold_start(tmp_path)["loaded"] == []